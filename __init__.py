@@ -1,13 +1,13 @@
 from aqt import mw, gui_hooks
 from aqt.webview import AnkiWebView, WebContent
-from aqt.utils import showInfo
-from aqt.qt import QSettings, QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QSlider, Qt, QLabel, QDialogButtonBox, QFont, QShortcut, QKeySequence, QAction, QDesktopServices, QUrl, QTextEdit, QWidget, QSize, QIcon, QPixmap, QFileDialog
+from aqt.utils import showInfo, tooltip
+from aqt.qt import QSettings, QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QSlider, Qt, QLabel, QDialogButtonBox, QFont, QShortcut, QKeySequence, QAction, QDesktopServices, QUrl, QTextEdit, QWidget, QSize, QIcon, QPixmap, QFileDialog, QCheckBox, QComboBox, QDateEdit, QDate, QFormLayout, QListWidget, QListWidgetItem, QSpinBox
 from aqt.sound import play, MpvManager, av_player
 
 from .bootstrapper import ensure_dependencies
 
 import tempfile
-import time
+import json
 import shutil
 import os
 
@@ -36,9 +36,17 @@ if dependencies_ready:
 else:
     TTS = None
 
-from .ankipa import AnkiPA
-
-from .stats import get_stats
+from .ankipa import TIMEOUT_PER_AUDIO_SECOND, AnkiPA
+
+from .stats import (
+    flush_stats,
+    daily_summaries,
+    today_summary,
+    add_listener as add_stats_listener,
+    remove_listener as remove_stats_listener,
+)
+from .deadline import Deadline
+from .export import EXPORT_FORMATS, export_history, history_decks
 from .templates.loader import load_template
 
 
@@ -84,8 +92,9 @@ def get_sound(percentage):
 
 class ResultsDialog(QDialog):
 
-    def __init__(self, html: str, pronunciation_score: float):
+    def __init__(self, session):
         super().__init__(mw)
+        self.session = session
         self.setWindowTitle("AnkiPA Results")
 
         vbox = QVBoxLayout()
@@ -118,18 +127,18 @@ class ResultsDialog(QDialog):
         vbox.addLayout(self.options)
         vbox.addWidget(self.web)
 
-        self.web.setHtml(html)
+        self.web.setHtml(session.html)
         self.resize(1024, 720)
 
         self.setLayout(vbox)
 
         if app_settings.value("sound-effects", "False") == "True":
-            play(get_sound(pronunciation_score))
+            play(get_sound(session.pronunciation))
 
     def replay_voice(self):
         self.update_audio_speed()
-        if AnkiPA.RECORDED is not None:
-            play(AnkiPA.RECORDED)
+        if self.session.recorded is not None:
+            play(self.session.recorded)
 
 
     def replay_tts(self):
@@ -141,21 +150,131 @@ class ResultsDialog(QDialog):
             )
             return
 
-        if AnkiPA.TTS_GEN is None:
-            generated = TTS.gen_tts_audio(text=AnkiPA.REFTEXT)
+        if self.session.tts_gen is None or not os.path.exists(self.session.tts_gen):
+            generated = TTS.gen_tts_audio(text=self.session.reftext)
 
             if not generated:
                 showInfo("There was an error generating the TTS audio.")
                 return
 
-            AnkiPA.TTS_GEN = generated
+            self.session.tts_gen = generated
 
-        play(AnkiPA.TTS_GEN)
+        play(self.session.tts_gen)
 
     def update_audio_speed(self):
         set_audio_speed(self.audio_speed.value() / 100)
 
 
+class ResultsQueueDialog(QDialog):
+    """Lists assessments that are being scored or have finished."""
+
+    def __init__(self):
+        super().__init__(mw)
+        self.setWindowTitle("AnkiPA Results Queue")
+
+        self.list = QListWidget(self)
+        self.list.itemActivated.connect(self.open_result)
+        self.list.currentItemChanged.connect(self.update_buttons)
+
+        self.cancel_btn = QPushButton("Cancel scoring", self)
+        self.cancel_btn.clicked.connect(self.cancel_selected)
+        self.cancel_btn.setEnabled(False)
+
+        vbox = QVBoxLayout()
+        vbox.addWidget(QLabel("Double-click a finished assessment to open it."))
+        vbox.addWidget(self.list)
+        vbox.addWidget(self.cancel_btn)
+        self.setLayout(vbox)
+        self.resize(420, 360)
+
+        self.refresh()
+
+    def refresh(self):
+        selected = self.selected_session()
+        self.list.clear()
+        for session in reversed(AnkiPA.SCHEDULER.sessions()):
+            if session.status == "done":
+                status = f"{int(session.pronunciation)}%"
+            elif session.status == "scoring" and session.partial:
+                status = f"Scoring {int(session.partial['Progress'] * 100)}% read"
+            else:
+                status = session.status.capitalize()
+            text = session.reftext if len(session.reftext) <= 40 else session.reftext[:37] + "..."
+            item = QListWidgetItem(f"{status}  -  {text}")
+            item.setData(Qt.ItemDataRole.UserRole, session.id)
+            self.list.addItem(item)
+            if selected is not None and session.id == selected.id:
+                self.list.setCurrentItem(item)
+        self.update_buttons()
+
+    def selected_session(self):
+        item = self.list.currentItem()
+        if item is None:
+            return None
+        session_id = item.data(Qt.ItemDataRole.UserRole)
+        for session in AnkiPA.SCHEDULER.sessions():
+            if session.id == session_id:
+                return session
+        return None
+
+    def update_buttons(self, *args):
+        session = self.selected_session()
+        self.cancel_btn.setEnabled(session is not None and session.status == "scoring")
+
+    def cancel_selected(self):
+        session = self.selected_session()
+        if session is not None and session.status == "scoring":
+            AnkiPA.SCHEDULER.cancel(session)
+            self.cancel_btn.setEnabled(False)
+
+    def open_result(self, item: QListWidgetItem):
+        session_id = item.data(Qt.ItemDataRole.UserRole)
+        for session in AnkiPA.SCHEDULER.sessions():
+            if session.id == session_id and session.status == "done":
+                AnkiPA.show_result(session)
+                break
+
+
+_results_queue = None
+
+
+def results_queue_dialog():
+    global _results_queue
+
+    if _results_queue is None:
+        _results_queue = ResultsQueueDialog()
+    _results_queue.refresh()
+    _results_queue.show()
+    _results_queue.raise_()
+
+
+def on_session_updated(session):
+    if _results_queue is not None and _results_queue.isVisible():
+        _results_queue.refresh()
+
+    if session.status == "scoring":
+        # Shown for every update, so even a single slow assessment shows
+        # progress and how to cancel it
+        pending = AnkiPA.SCHEDULER.pending()
+        if pending > 1:
+            message = f"scoring {pending} recordings..."
+        elif session.partial and "Progress" in session.partial:
+            message = f"scoring... {session.partial['Progress']:.0%} read"
+        else:
+            message = "scoring..."
+        tooltip(f"AnkiPA: {message} (cancel from Tools > AnkiPA Results Queue)")
+    elif session.status == "failed" and session.error:
+        tooltip(f"AnkiPA: {session.error}")
+    elif session.status == "done":
+        # When queued, results are collected in the queue instead of popping
+        # up; an open queue was refreshed above, and is never brought forward
+        if app_settings.value("results-queue", "False") != "True":
+            AnkiPA.show_result(session)
+
+
+AnkiPA.SCHEDULER.add_listener(on_session_updated)
+
+
 class AnkiPADialog(QDialog):
     def __init__(self, *args, **kwargs):
         super(AnkiPADialog, self).__init__(*args, **kwargs)
@@ -187,58 +306,109 @@ class AnkiPADialog(QDialog):
         self.export_stats_btn = QPushButton("Export Stats", self)
         self.export_stats_btn.clicked.connect(self.export_stats)
 
+        # Results queue
+        self.results_queue_btn = QPushButton("Results Queue", self)
+        self.results_queue_btn.clicked.connect(results_queue_dialog)
+
+        self.results_queue_check = QCheckBox("Collect results in the queue instead of popups", self)
+        self.results_queue_check.setChecked(app_settings.value("results-queue", "False") == "True")
+        self.results_queue_check.toggled.connect(
+            lambda checked: app_settings.setValue("results-queue", str(checked))
+        )
+
+        # Automatic endpointing
+        self.auto_stop_check = QCheckBox("Stop recording after the text is read", self)
+        self.auto_stop_check.setChecked(app_settings.value("auto-stop", "False") == "True")
+        self.auto_stop_check.toggled.connect(
+            lambda checked: app_settings.setValue("auto-stop", str(checked))
+        )
+
+        self.auto_stop_silence = QSpinBox(self)
+        self.auto_stop_silence.setRange(200, 5000)
+        self.auto_stop_silence.setSingleStep(100)
+        self.auto_stop_silence.setSuffix(" ms silence")
+        self.auto_stop_silence.setValue(int(app_settings.value("auto-stop-silence", 800)))
+        self.auto_stop_silence.valueChanged.connect(
+            lambda value: app_settings.setValue("auto-stop-silence", value)
+        )
+
+        auto_stop = QHBoxLayout()
+        auto_stop.addWidget(self.auto_stop_check)
+        auto_stop.addWidget(self.auto_stop_silence)
+
+        # Parallel decoding
+        self.parallel_check = QCheckBox("Decode long recordings on all cores", self)
+        self.parallel_check.setChecked(app_settings.value("parallel-decoding", "False") == "True")
+        self.parallel_check.toggled.connect(
+            lambda checked: app_settings.setValue("parallel-decoding", str(checked))
+        )
+
+        # N-best rescoring
+        self.nbest_spin = QSpinBox(self)
+        self.nbest_spin.setRange(0, 10)
+        self.nbest_spin.setSpecialValueText("Off")
+        self.nbest_spin.setValue(int(app_settings.value("nbest", 0)))
+        self.nbest_spin.valueChanged.connect(lambda value: app_settings.setValue("nbest", value))
+
+        nbest = QHBoxLayout()
+        nbest.addWidget(QLabel("Alternatives to rescore", self))
+        nbest.addWidget(self.nbest_spin)
+
+        # Assessment deadline
+        self.timeout_spin = QSpinBox(self)
+        self.timeout_spin.setRange(0, 600)
+        self.timeout_spin.setSingleStep(10)
+        self.timeout_spin.setSuffix(" s")
+        self.timeout_spin.setSpecialValueText("Off")
+        self.timeout_spin.setValue(int(app_settings.value("assessment-timeout", 60)))
+        self.timeout_spin.valueChanged.connect(lambda value: app_settings.setValue("assessment-timeout", value))
+
+        timeout = QHBoxLayout()
+        timeout.addWidget(QLabel("Stop scoring after", self))
+        timeout.addWidget(self.timeout_spin)
+        timeout.addWidget(QLabel(f"plus {TIMEOUT_PER_AUDIO_SECOND:g} s per recorded second", self))
+
+        # TTS prefetch
+        self.prefetch_tts_check = QCheckBox("Generate TTS when a card is shown", self)
+        self.prefetch_tts_check.setChecked(app_settings.value("prefetch-tts", "False") == "True")
+        self.prefetch_tts_check.toggled.connect(
+            lambda checked: app_settings.setValue("prefetch-tts", str(checked))
+        )
+
+        # Recording archive
+        self.archive_check = QCheckBox("Archive recordings for re-analysis", self)
+        self.archive_check.setChecked(app_settings.value("archive-recordings", "False") == "True")
+        self.archive_check.toggled.connect(
+            lambda checked: app_settings.setValue("archive-recordings", str(checked))
+        )
+
         self.base_layout.addWidget(self.ankipa_label)
         self.base_layout.addWidget(self.statistics_btn)
         self.base_layout.addWidget(self.about_btn)
         self.base_layout.addWidget(self.export_stats_btn)
+        self.base_layout.addWidget(self.results_queue_btn)
+        self.base_layout.addWidget(self.results_queue_check)
+        self.base_layout.addLayout(auto_stop)
+        self.base_layout.addWidget(self.parallel_check)
+        self.base_layout.addLayout(nbest)
+        self.base_layout.addLayout(timeout)
+        self.base_layout.addWidget(self.prefetch_tts_check)
+        self.base_layout.addWidget(self.archive_check)
 
         self.setLayout(self.base_layout)
 
         self.setMinimumWidth(180)
 
     def statistics_dialog(self):
-        html = ""
-        with open(os.path.join(addon, f"chart{os.sep}chart.html"), "r", encoding="utf-8") as fp:
-            for line in fp.readlines():
-                html += line
-
-        # Get statistics data
-        stats_data = get_stats()
-        days = sorted(
-            list(stats_data.keys()),
-            key=lambda d: time.strptime(d, "%d/%m/%Y"),
-            reverse=True,
-        )
-        ndays = len(days)
-        days = days[: 31 if ndays > 31 else ndays]
-        days = days[::-1]
-
-        pronunciation = []
-        accuracy = []
-        fluency = []
-        pron_time = []
-        pron_words = []
-        assessments = []
-
-        for day in days:
-            pronunciation.append(stats_data[day]["avg_pronunciation"])
-            accuracy.append(stats_data[day]["avg_accuracy"])
-            fluency.append(stats_data[day]["avg_fluency"])
-            pron_time.append(stats_data[day]["pronunciation_time"])
-            pron_words.append(stats_data[day]["words"])
-            assessments.append(stats_data[day]["assessments"])
-
-        html = (
-            html.replace("['DAYS']", str(days))
-            .replace("['PRONUNCIATION']", str(pronunciation))
-            .replace("['ACCURACY']", str(accuracy))
-            .replace("['FLUENCY']", str(fluency))
-            .replace("['PRON_TIME']", str(pron_time))
-            .replace("['PRON_WORDS']", str(pron_words))
-            .replace("['ASSESSMENTS']", str(assessments))
-        )
+        global _statistics_dialog
 
-        StatisticsDialog(html).show()
+        # The dashboard is built once and kept up to date while it exists
+        if _statistics_dialog is None:
+            _statistics_dialog = StatisticsDialog()
+        else:
+            _statistics_dialog.refresh()
+        _statistics_dialog.show()
+        _statistics_dialog.raise_()
 
     def about_dialog(self):
         dialog = QDialog(mw)
@@ -292,28 +462,154 @@ class AnkiPADialog(QDialog):
         dialog.show()
 
     def export_stats(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, "Save Stats", "", "JSON Files (*.json)")
-        if file_path:
-            import shutil
-            shutil.copy(os.path.join(addon, "stats.json"), file_path)
-            showInfo("Stats exported successfully!")
+        ExportDialog(self).show()
+
+
+class ExportDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent or mw)
+        self.setWindowTitle("AnkiPA Export")
+
+        self.format_combo = QComboBox(self)
+        for fmt, label in EXPORT_FORMATS.items():
+            self.format_combo.addItem(label, fmt)
+
+        self.date_check = QCheckBox("Only between", self)
+        self.start_date = QDateEdit(QDate.currentDate().addMonths(-1), self)
+        self.end_date = QDateEdit(QDate.currentDate(), self)
+        for edit in (self.start_date, self.end_date):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("dd/MM/yyyy")
+
+        self.deck_combo = QComboBox(self)
+        self.deck_combo.addItem("All decks", None)
+        for deck in history_decks():
+            self.deck_combo.addItem(deck, deck)
+
+        self.card_check = QCheckBox("Current card only", self)
+
+        dates = QHBoxLayout()
+        dates.addWidget(self.date_check)
+        dates.addWidget(self.start_date)
+        dates.addWidget(self.end_date)
+
+        # The raw stats file is copied whole, so filters do not apply to it
+        self.format_combo.currentIndexChanged.connect(self.update_filters)
+        self.update_filters()
+
+        form = QFormLayout()
+        form.addRow("Format", self.format_combo)
+        form.addRow("Dates", dates)
+        form.addRow("Deck", self.deck_combo)
+        form.addRow("", self.card_check)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.export)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def update_filters(self, *args):
+        filtered = self.format_combo.currentData() != "json"
+        for widget in (self.date_check, self.start_date, self.end_date, self.deck_combo):
+            widget.setEnabled(filtered)
+        self.card_check.setEnabled(filtered and mw.reviewer.card is not None)
+
+    def export(self):
+        fmt = self.format_combo.currentData()
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Stats", "", EXPORT_FORMATS[fmt])
+        if not file_path:
+            return
+
+        filters = {}
+        if fmt != "json":
+            filters["deck"] = self.deck_combo.currentData()
+            if self.date_check.isChecked():
+                filters["start"] = self.start_date.date().toPyDate()
+                filters["end"] = self.end_date.date().toPyDate()
+            if self.card_check.isChecked() and mw.reviewer.card:
+                filters["card_id"] = mw.reviewer.card.id
+
+        rescore = None
+        if fmt == "rescored":
+            # Decoded like new assessments; stopped when the profile closes
+            deadline = Deadline()
+            gui_hooks.profile_will_close.append(deadline.cancel)
+            rescore = {
+                "parallel": app_settings.value("parallel-decoding", "False") == "True",
+                "nbest": int(app_settings.value("nbest", 0)),
+                "deadline": deadline,
+            }
+
+        def on_done(future):
+            if rescore is not None:
+                gui_hooks.profile_will_close.remove(rescore["deadline"].cancel)
+            try:
+                rows = future.result()
+            except Exception as e:
+                showInfo(f"Failed to export stats: {e}", title="AnkiPA")
+                return
+            showInfo(f"Stats exported successfully! ({rows} assessments)")
+
+        # Large histories, and re-scoring them, run off the GUI thread
+        mw.taskman.run_in_background(lambda: export_history(file_path, fmt, rescore, **filters), on_done)
+        self.accept()
 
 
 class StatisticsDialog(QDialog):
-    def __init__(self, html: str):
+    def __init__(self):
         super().__init__(mw)
         self.setWindowTitle("AnkiPA Statistics")
 
         vbox = QVBoxLayout()
         self.web = AnkiWebView(self)
+        self.web.set_bridge_command(self.on_bridge_cmd, self)
 
         vbox.addWidget(self.web)
 
-        self.web.stdHtml(html)
+        with open(os.path.join(addon, f"chart{os.sep}chart.html"), "r", encoding="utf-8") as fp:
+            self.web.stdHtml(fp.read(), context=self)
         self.resize(1024, 720)
 
         self.setLayout(vbox)
 
+        add_stats_listener(self.on_assessment)
+        self.destroyed.connect(lambda: remove_stats_listener(self.on_assessment))
+
+    def on_bridge_cmd(self, cmd: str):
+        # ankipa:stats:<days> returns the daily summaries as JSON
+        if cmd.startswith("ankipa:stats:"):
+            return daily_summaries(int(cmd.split(":")[2]))
+        # ankipa:trends returns percentiles, moving average and per-deck trends
+        if cmd == "ankipa:trends":
+            try:
+                from .analytics import trends_summary
+            except Exception as e:
+                print(f"[AnkiPA] Trends unavailable: {e}")
+                return None
+            return trends_summary()
+        return None
+
+    def on_assessment(self, entry: dict):
+        # Called from the assessment thread
+        mw.taskman.run_on_main(self.push_today)
+
+    def push_today(self):
+        if self.isVisible():
+            self.web.eval(f"AnkiPAStats.upsert({json.dumps(today_summary())})")
+            self.web.eval("AnkiPAStats.refreshTrends()")
+
+    def refresh(self):
+        self.web.eval("AnkiPAStats.refresh()")
+
+
+_statistics_dialog = None
+
 
 def main_dialog():
     AnkiPADialog(mw).show()
@@ -336,11 +632,18 @@ mw.addonManager.setWebExports(__name__, r"(chart/.*(css|js)|bridge\.js)")
 gui_hooks.webview_will_set_content.append(on_webview_will_set_content)
 
 gui_hooks.av_player_did_end_playing.append(lambda _: set_audio_speed(1.0))
+gui_hooks.profile_will_close.append(flush_stats)
+gui_hooks.reviewer_did_show_question.append(AnkiPA.PREFETCH.on_question_shown)
+gui_hooks.reviewer_will_end.append(AnkiPA.PREFETCH.clear)
 
 ankipa_action = QAction("AnkiPA...", mw)
 ankipa_action.triggered.connect(main_dialog)
 mw.form.menuTools.addAction(ankipa_action)
 
+results_queue_action = QAction("AnkiPA Results Queue", mw)
+results_queue_action.triggered.connect(results_queue_dialog)
+mw.form.menuTools.addAction(results_queue_action)
+
 curr_shortcut = app_settings.value("shortcut", defaultValue="W")
 shortcut = QShortcut(QKeySequence(f"Ctrl+{curr_shortcut}"), mw)
 
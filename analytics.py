@@ -0,0 +1,362 @@
+import threading
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .export import HISTORY_COLUMNS, _parse_day
+from .stats import add_listener, get_stats
+
+# History fields kept as columns; the deck name is stored as a code into
+# HistoryColumns.decks instead
+COLUMNS = (
+    "timestamp",
+    "card_id",
+    "accuracy",
+    "fluency",
+    "pronunciation_score",
+    "audio_length",
+    "mispronunciations",
+    "omissions",
+    "insertions",
+    "reps",
+    "interval",
+)
+
+SCORE_COLUMNS = ("pronunciation_score", "accuracy", "fluency")
+
+_SECONDS_PER_DAY = 86400.0
+
+# A slope is only reported for decks practised on at least this many days;
+# over a single session it just amplifies noise into points per day
+MIN_TREND_DAYS = 2
+
+# Day keys are re-read on every refresh; parse each one once
+_day_of = lru_cache(maxsize=4096)(_parse_day)
+
+
+class HistoryColumns:
+    """Assessment history as one NumPy array per field, oldest first.
+
+    Instances are never modified; appending returns a new instance, so a
+    snapshot can be queried while new assessments come in.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], deck: np.ndarray, decks: List[str]):
+        self.columns = columns
+        self.deck = deck
+        self.decks = decks
+
+    @classmethod
+    def empty(cls) -> "HistoryColumns":
+        columns = {name: np.empty(0, dtype=HISTORY_COLUMNS[name]) for name in COLUMNS}
+        return cls(columns, np.empty(0, dtype=np.int32), [])
+
+    def __len__(self) -> int:
+        return len(self.deck)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def appended(self, entries: Sequence[dict]) -> "HistoryColumns":
+        if not entries:
+            return self
+
+        decks = list(self.decks)
+        codes = {name: code for code, name in enumerate(decks)}
+        deck = np.empty(len(entries), dtype=np.int32)
+        for i, entry in enumerate(entries):
+            name = entry.get("deck_name") or ""
+            code = codes.get(name)
+            if code is None:
+                code = codes[name] = len(decks)
+                decks.append(name)
+            deck[i] = code
+
+        columns = {}
+        for name, column in self.columns.items():
+            values = [entry.get(name) for entry in entries]
+            if column.dtype.kind == "M":
+                values = [v or "NaT" for v in values]
+            elif column.dtype.kind == "f":
+                values = [np.nan if v in (None, "") else v for v in values]
+            else:
+                values = [0 if v in (None, "") else v for v in values]
+            columns[name] = np.concatenate([column, np.asarray(values, dtype=column.dtype)])
+
+        return HistoryColumns(columns, np.concatenate([self.deck, deck]), decks)
+
+    def without(self, start: int, stop: int) -> "HistoryColumns":
+        """Return a copy without rows ``start`` to ``stop``."""
+        if stop <= start:
+            return self
+        rows = slice(start, stop)
+        columns = {name: np.delete(column, rows) for name, column in self.columns.items()}
+        return HistoryColumns(columns, np.delete(self.deck, rows), self.decks)
+
+    def days(self) -> np.ndarray:
+        """Timestamps as fractional days since the epoch; NaN where missing."""
+        timestamps = self.columns["timestamp"]
+        days = timestamps.astype("int64") / _SECONDS_PER_DAY
+        days[np.isnat(timestamps)] = np.nan
+        return days
+
+    def select(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        deck: Optional[str] = None,
+        card_id: Optional[int] = None,
+    ) -> np.ndarray:
+        """Boolean mask of the rows matching the same filters as export.iter_history."""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None or end is not None:
+            day = self.columns["timestamp"].astype("datetime64[D]")
+            if start is not None:
+                mask &= day >= np.datetime64(start, "D")
+            if end is not None:
+                mask &= day <= np.datetime64(end, "D")
+        if deck is not None:
+            mask &= self.deck == (self.decks.index(deck) if deck in self.decks else -1)
+        if card_id is not None:
+            mask &= self.columns["card_id"] == card_id
+        return mask
+
+
+# The current snapshot, and how far into the stats it reaches: the last day
+# read, the last history entry seen for that day and how many of that day's
+# entries the snapshot holds, which are its last rows. The entry is kept by
+# identity since the history cap trims days without changing their length
+_lock = threading.Lock()
+_history: Optional[HistoryColumns] = None
+_seen: Optional[Tuple[date, Optional[dict], int]] = None
+_stale = False
+
+
+def _on_assessment(entry: dict):
+    global _stale
+    _stale = True
+
+
+add_listener(_on_assessment)
+
+
+def _position_after(day_history: list, last: Optional[dict]) -> Optional[int]:
+    """Index just past ``last`` in a day's history, or None if it is gone."""
+    if last is None:
+        return 0
+    # New entries are appended, so search from the end
+    for i in range(len(day_history) - 1, -1, -1):
+        if day_history[i] is last:
+            return i + 1
+    return None
+
+
+def _read_since(stats: dict, seen: Optional[Tuple[date, Optional[dict], int]]):
+    """History entries recorded after ``seen``, the new ``seen`` position, and
+    how many of the entries read before for that day were trimmed since.
+
+    Returns None if the last entry seen is no longer there, i.e. it was
+    dropped by the history cap or the stats were reloaded.
+    """
+    days = []
+    for key in list(stats.keys()):
+        day = _day_of(key)
+        if day is not None and (seen is None or day >= seen[0]):
+            days.append((day, key))
+
+    entries = []
+    trimmed = 0
+    for day, key in sorted(days):
+        day_history = list(stats.get(key, {}).get("history", []))
+        skip = 0
+        if seen is not None and day == seen[0]:
+            skip = _position_after(day_history, seen[1])
+            if skip is None or skip > seen[2]:
+                return None
+            # The cap drops the oldest entries of the day
+            trimmed = seen[2] - skip
+        entries.extend(day_history[skip:])
+        seen = (day, day_history[-1] if day_history else None, len(day_history))
+    return entries, seen, trimmed
+
+
+def history() -> HistoryColumns:
+    """Return the history columns, loading them on first use.
+
+    New assessments only mark the snapshot stale; the entries recorded since
+    are read and appended on the next call.
+    """
+    global _history, _seen, _stale
+
+    with _lock:
+        if _history is not None and not _stale:
+            return _history
+
+        stats = get_stats()
+        _stale = False
+
+        update = _read_since(stats, _seen) if _history is not None else None
+        if update is None:
+            base = HistoryColumns.empty()
+            update = _read_since(stats, None)
+        else:
+            # Drop the rows the history cap trimmed off the last day read
+            start = len(_history) - _seen[2]
+            base = _history.without(start, start + update[2])
+
+        entries, _seen, _ = update
+        _history = base.appended(entries)
+        return _history
+
+
+def invalidate():
+    """Drop the snapshot, e.g. after the stats were replaced wholesale."""
+    global _history, _seen
+    with _lock:
+        _history = None
+        _seen = None
+
+
+def percentiles(
+    column: str = "pronunciation_score",
+    q: Sequence[float] = (10, 25, 50, 75, 90),
+    **filters,
+) -> Dict[float, Optional[float]]:
+    data = history()
+    values = data[column][data.select(**filters)]
+    values = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+    if not len(values):
+        return {p: None for p in q}
+    return dict(zip(q, np.percentile(values, q).tolist()))
+
+
+def moving_average(
+    column: str = "pronunciation_score",
+    window: int = 20,
+    **filters,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Trailing mean over the last ``window`` attempts, one value per attempt.
+
+    Returns the attempt timestamps and the averages. The first attempts are
+    averaged over however many came before them.
+    """
+    data = history()
+    mask = data.select(**filters)
+    if data[column].dtype.kind == "f":
+        mask &= ~np.isnan(data[column])
+    values = data[column][mask].astype(np.float64)
+    timestamps = data["timestamp"][mask]
+    if not len(values):
+        return timestamps, values
+
+    cumsum = np.cumsum(np.concatenate([[0.0], values]))
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    ends = np.arange(1, len(values) + 1)
+    return timestamps, (cumsum[ends] - cumsum[ends - counts]) / counts
+
+
+def deck_trends(
+    column: str = "pronunciation_score",
+    min_attempts: int = 5,
+    **filters,
+) -> List[dict]:
+    """Per-deck attempts, mean score and least-squares slope in points per day.
+
+    The slope is None for decks with attempts on fewer than MIN_TREND_DAYS days.
+    """
+    data = history()
+    mask = data.select(**filters)
+    values = data[column][mask].astype(np.float64)
+    deck = data.deck[mask]
+    x = data.days()[mask]
+
+    valid = ~np.isnan(values) & ~np.isnan(x)
+    values, deck, x = values[valid], deck[valid], x[valid]
+    if not len(values):
+        return []
+
+    size = len(data.decks)
+    # Count the distinct days per deck from unique (deck, day) pairs
+    day = np.floor(x).astype(np.int64)
+    stride = day.max() + 1
+    pairs = np.unique(deck.astype(np.int64) * stride + day)
+    distinct_days = np.bincount(pairs // stride, minlength=size)
+    x = x - x.min()
+
+    n = np.bincount(deck, minlength=size).astype(np.float64)
+    sx = np.bincount(deck, x, minlength=size)
+    sy = np.bincount(deck, values, minlength=size)
+    sxx = np.bincount(deck, x * x, minlength=size)
+    sxy = np.bincount(deck, x * values, minlength=size)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = sy / n
+        variance = sxx - sx * sx / n
+        slope = np.where(variance > 1e-9, (sxy - sx * sy / n) / variance, np.nan)
+    slope[distinct_days < MIN_TREND_DAYS] = np.nan
+
+    trends = []
+    for code in np.flatnonzero(n >= max(min_attempts, 1)):
+        trends.append({
+            "deck": data.decks[code],
+            "attempts": int(n[code]),
+            "mean": round(float(mean[code]), 2),
+            "slope": None if np.isnan(slope[code]) else round(float(slope[code]), 3),
+        })
+    trends.sort(key=lambda trend: -trend["attempts"])
+    return trends
+
+
+def correlation(column: str = "pronunciation_score", against: str = "interval", **filters) -> Optional[float]:
+    """Pearson correlation between two columns, or None without enough spread."""
+    data = history()
+    mask = data.select(**filters)
+    a = data[column][mask].astype(np.float64)
+    b = data[against][mask].astype(np.float64)
+    valid = ~np.isnan(a) & ~np.isnan(b)
+    a, b = a[valid], b[valid]
+    if len(a) < 2:
+        return None
+
+    a = a - a.mean()
+    b = b - b.mean()
+    denominator = np.sqrt((a * a).sum() * (b * b).sum())
+    if denominator == 0:
+        return None
+    return round(float((a * b).sum() / denominator), 3)
+
+
+def deck_names() -> List[str]:
+    """Names of all decks with recorded assessments, sorted."""
+    data = history()
+    used = np.unique(data.deck)
+    return sorted(name for name in (data.decks[code] for code in used) if name)
+
+
+def trends_summary(window: int = 20, points: int = 300, **filters) -> dict:
+    """Everything the statistics dashboard shows about trends, as plain JSON values."""
+    timestamps, averages = moving_average("pronunciation_score", window, **filters)
+    if len(averages) > points:
+        # Thin the line out evenly; always keep the latest attempt
+        index = np.unique(np.linspace(0, len(averages) - 1, points).round().astype(int))
+        timestamps, averages = timestamps[index], averages[index]
+
+    return {
+        "attempts": int(history().select(**filters).sum()),
+        "percentiles": {
+            column: {str(int(p)): None if v is None else round(v, 1) for p, v in percentiles(column, **filters).items()}
+            for column in SCORE_COLUMNS
+        },
+        "moving_average": {
+            "labels": np.datetime_as_string(timestamps, unit="m").tolist(),
+            "values": np.round(averages, 2).tolist(),
+            "window": window,
+        },
+        "decks": deck_trends(**filters),
+        "correlations": {
+            against: correlation("pronunciation_score", against, **filters)
+            for against in ("interval", "reps")
+        },
+    }
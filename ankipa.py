@@ -1,15 +1,18 @@
+import html
 import re
 import time
 import wave
-import threading
-from typing import Optional
+from typing import Optional, Tuple
 
 from aqt import mw
 from aqt.sound import RecordDialog
 from aqt.qt import Qt
 
-from .stats import get_stat, log_assessment, update_stat, update_avg_stat, save_stats
-from .templates.loader import load_template
+from .deadline import Deadline
+from .prefetch import PrefetchScheduler
+from .session import AssessmentScheduler, AssessmentSession
+from .stats import previous_attempts, record_assessment, save_stats
+from .templates.loader import Raw, compile_template
 
 
 # Regex to clean HTML and tags
@@ -17,99 +20,199 @@ _REMOVE_HTML_RE = re.compile(r"<[^<]+?>")
 _REMOVE_TAG_RE = re.compile(r"\[[^\]]+\]")
 
 # Load templates
-_WORD_HTML: str = load_template("word.html")
-_RESULT_HTML: str = load_template("result.html")
-_RECOGNITION_ERROR_HTML: str = load_template("recognition_error.html")
+_WORD_HTML = compile_template("word.html")
+_RESULT_HTML = compile_template("result.html")
+_PREVIOUS_HTML = compile_template("previous.html")
+_ATTEMPT_HTML = compile_template("attempt.html")
+
+
+# Earlier attempts shown with each result
+PREVIOUS_ATTEMPTS = 5
+
+# Scoring time allowed per second of recording, on top of the
+# assessment-timeout setting, so long passages are not cut short
+TIMEOUT_PER_AUDIO_SECOND = 3.0
+
+
+def _audio_length(path: str) -> float:
+    """Length of a WAV recording in seconds, or 0 if it cannot be read."""
+    try:
+        with wave.open(path, "rb") as wf:
+            return wf.getnframes() / float(wf.getframerate())
+    except Exception:
+        return 0.0
+
+
+def _previous_html(previous: list, pronunciation: float) -> str:
+    """Summarise earlier attempts at the card and the change since the last one."""
+    if not previous:
+        return ""
+
+    # Scores are shown as whole percentages, so compare those
+    change = int(pronunciation) - int(previous[-1].get("pronunciation_score", 0))
+    return _PREVIOUS_HTML.render({
+        "TREND": "up" if change > 0 else "down" if change < 0 else "same",
+        "CHANGE": f"{change:+d}%" if change else "No change",
+        "ATTEMPTS": _ATTEMPT_HTML.render_many(
+            {
+                "DATE": entry.get("timestamp", "").replace("T", " "),
+                "SCORE": int(entry.get("pronunciation_score", 0)),
+            }
+            for entry in previous
+        ),
+    })
+
+
+def card_reference(card) -> Tuple[str, str]:
+    """Return the field used as reference and its cleaned text for a card."""
+    note = card.note()
+
+    # Use first field by default
+    field = mw.col.models.field_names(note.note_type())[0]
+    to_read = note[field]
+
+    # Clean HTML and tags
+    to_read = re.sub(_REMOVE_HTML_RE, " ", to_read)
+    to_read = re.sub(_REMOVE_TAG_RE, "", to_read).strip()
+
+    return field, to_read
+
 
 class AnkiPA:
-    REFTEXT: Optional[str] = None
-    RECORDED: Optional[str] = None
-    TTS_GEN: Optional[str] = None
-    RESULT: Optional[dict] = None
-    DIAG: Optional[RecordDialog] = None
+    SCHEDULER = AssessmentScheduler()
+    PREFETCH = PrefetchScheduler(card_reference)
 
     @classmethod
     def test_pronunciation(cls):
         """Extract text from current card and record user voice."""
-        if mw.reviewer.card is None:
+        card = mw.reviewer.card
+        if card is None:
             return
 
-        # Use first field by default
-        field = mw.col.models.field_names(mw.reviewer.card.note().note_type())[0]
-        cls.FIELD = field
-        to_read = mw.reviewer.card.note()[field]
+        note = card.note()
+        field, to_read = card_reference(card)
 
-        # Clean HTML and tags
-        to_read = re.sub(_REMOVE_HTML_RE, " ", to_read)
-        to_read = re.sub(_REMOVE_TAG_RE, "", to_read).strip()
+        try:
+            deck_name = mw.col.decks.name(card.did)
+        except Exception:
+            deck_name = ""
 
-        cls.REFTEXT = to_read
-        cls.DIAG = RecordDialog(mw, mw, cls.after_record)
+        session = AssessmentSession(
+            reftext=to_read,
+            field_name=field,
+            note_id=getattr(note, "id", -1),
+            card_id=getattr(card, "id", -1),
+            deck_name=deck_name,
+            reps=getattr(card, "reps", 0),
+            interval=getattr(card, "ivl", 0),
+        )
+        session.prepared = cls.PREFETCH.take(session.card_id, to_read)
+        if session.prepared is not None:
+            session.tts_gen = session.prepared.tts_path
+
+        dialog = RecordDialog(mw, mw, lambda recorded_voice: cls.after_record(session, recorded_voice))
+
+        from . import app_settings
+        if app_settings.value("auto-stop", "False") == "True":
+            try:
+                from .endpointing import AutoStop
+                from .pronunciation import _tokenise
+            except Exception as e:
+                print(f"[AnkiPA] Auto-stop unavailable: {e}")
+            else:
+                tokens = session.prepared.tokens if session.prepared and session.prepared.tokens else _tokenise(to_read)
+                AutoStop.attach(dialog, tokens, int(app_settings.value("auto-stop-silence", 800)))
 
     @classmethod
-    def after_record(cls, recorded_voice: Optional[str]) -> None:
-        """Handle recorded voice, run pronunciation assessment, update stats, and display results."""
-        if not recorded_voice or not cls.REFTEXT:
+    def after_record(cls, session: AssessmentSession, recorded_voice: Optional[str]) -> None:
+        """Queue the recorded voice for assessment; results are shown once scored."""
+        if not recorded_voice or not session.reftext:
             print("Error: No recorded voice or reference text available.")
             return
 
-        cls.RECORDED = recorded_voice
-        cls.RESULT = None
-
-        # Run pronunciation assessment in thread
+        from . import app_settings
+        session.archive = app_settings.value("archive-recordings", "False") == "True"
+        session.parallel = app_settings.value("parallel-decoding", "False") == "True"
+        session.nbest = int(app_settings.value("nbest", 0))
+        session.keep_recording(recorded_voice)
+
+        # Seconds a worker may spend on one recording, growing with its
+        # length; a setting of 0 means no limit
+        timeout = float(app_settings.value("assessment-timeout", 60))
+        if timeout:
+            timeout += TIMEOUT_PER_AUDIO_SECOND * _audio_length(session.recorded)
+        session.deadline = Deadline(timeout or None)
+        cls.SCHEDULER.submit(session, cls._assess)
+
+    @staticmethod
+    def _assess(session: AssessmentSession) -> None:
+        """Run pronunciation assessment, update stats and prepare the result HTML.
+
+        Runs on a scheduler worker thread.
+        """
         try:
             from .pronunciation import pron_assess
         except Exception as e:
             print(f"Pronunciation import failed: {e}")
-            cls.RESULT = {"error": "Local speech engine unavailable. Please restart Anki after installing dependencies."}
-            mw.taskman.run_on_main(lambda: mw.reviewer.web.setHtml(_RECOGNITION_ERROR_HTML))
+            session.status = "failed"
+            session.error = "Local speech engine unavailable. Please restart Anki after installing dependencies."
             return
 
-        t = threading.Thread(
-            target=pron_assess,
-            args=(cls.REFTEXT, recorded_voice)
+        recognizer = session.prepared.recognizer if session.prepared else None
+        result = pron_assess(
+            session.reftext,
+            session.recorded,
+            session.archive,
+            recognizer,
+            on_partial=lambda partial: AnkiPA.SCHEDULER.report(session, partial),
+            parallel=session.parallel,
+            nbest=session.nbest,
+            deadline=session.deadline,
         )
-        t.start()
-        t.join()
+        session.result = result
+        # The recognizer is consumed, or abandoned mid-utterance if stopped
+        if session.prepared is not None:
+            session.prepared.recognizer = None
+
+        stopped = result.get("Stopped") if isinstance(result, dict) else None
+        if stopped == "cancelled":
+            session.status = "cancelled"
+            return
+        if stopped and result.get("error"):
+            session.status = "failed"
+            session.error = result["error"]
+            return
 
-        if cls.RESULT is None:
-            msg = "Speech recognition failed. Local engine may be initializing; retry once."
-            mw.taskman.run_on_main(lambda: mw.reviewer.web.setHtml(f"<b>{msg}</b>"))
+        # Failures are reported through the session, since the reviewer may
+        # already show another card
+        if result is None:
+            session.status = "failed"
+            session.error = "Speech recognition failed. Local engine may be initializing; retry once."
             return
 
-        if isinstance(cls.RESULT, dict) and cls.RESULT.get("error"):
-            # Local recognition fallback screen
-            mw.taskman.run_on_main(lambda: mw.reviewer.web.setHtml(_RECOGNITION_ERROR_HTML))
+        if isinstance(result, dict) and result.get("error"):
+            session.status = "failed"
+            session.error = result["error"]
+            return
 
-        if "NBest" not in cls.RESULT or not cls.RESULT["NBest"]:
-            print("No pronunciation result:", cls.RESULT)
+        if "NBest" not in result or not result["NBest"]:
+            print("No pronunciation result:", result)
+            session.status = "failed"
+            session.error = "No speech was recognised in the recording."
             return
 
-        scores = cls.RESULT["NBest"][0]
+        scores = result["NBest"][0]
         accuracy = scores.get("AccuracyScore", 0)
         fluency = scores.get("FluencyScore", 0)
         pronunciation = scores.get("PronScore", 0)
 
-        # Update stats
-        update_stat("assessments", 1)
-        current_assessments = get_stat("assessments")
-        
-        update_avg_stat("avg_accuracy", accuracy, current_assessments)
-        update_avg_stat("avg_fluency", fluency, current_assessments)
-        update_avg_stat("avg_pronunciation", pronunciation, current_assessments)
-
-        # Prepare result HTML
-        html = _RESULT_HTML.replace("[ACCURACY]", str(int(accuracy)))
-        html = html.replace("[FLUENCY]", str(int(fluency)))
-        html = html.replace("[PRONUNCIATION]", str(int(pronunciation)))
-
         # Prepare word details
         words_list = scores.get("Words", [])
         if not isinstance(words_list, list):
             words_list = []
 
         errors = {"Mispronunciation": 0, "Omission": 0, "Insertion": 0}
-        words_html = ""
+        words = []
 
         for word in words_list:
             syllables = ""
@@ -117,88 +220,94 @@ class AnkiPA:
                 for i, syllable in enumerate(word["Syllables"]):
                     add = " &#x2022; " if i < (len(word["Syllables"]) - 1) else ""
                     syllables += (
-                        f"<span style='color: black;'>{syllable.get('Syllable', '')}</span>"
+                        f"<span style='color: black;'>{html.escape(str(syllable.get('Syllable', '')))}</span>"
                         f"<span style='color: white;'>{add}</span>"
                     )
 
             error = word.get("ErrorType", "None")
-            words_html += (
-                _WORD_HTML.replace("[WORD]", word.get("Word", ""))
-                .replace("[SYLLABLES]", syllables)
-                .replace("[ERROR]", error)
-                .replace("[ERROR-INFO]", error if error != "None" else "Correct")
-            )
+            words.append({
+                "WORD": word.get("Word", ""),
+                "SYLLABLES": Raw(syllables),
+                "ERROR": error,
+                "ERROR-INFO": error if error != "None" else "Correct",
+            })
             if error != "None" and error in errors:
                 errors[error] += 1
 
-        # Replace word list and error counts
-        html = html.replace("[WORDLIST]", words_html)
-        html = html.replace("[MISPRONUNCIATIONS]", str(errors["Mispronunciation"]))
-        html = html.replace("[OMISSIONS]", str(errors["Omission"]))
-        html = html.replace("[INSERTIONS]", str(errors["Insertion"]))
+        notice = ""
+        if stopped:
+            notice = (
+                f"Scoring took longer than {session.deadline.seconds:g} seconds and was stopped. "
+                "Only the words recognised until then are shown."
+            )
+
+        # Looked up before this attempt is recorded
+        previous = previous_attempts(session.card_id, session.note_id, PREVIOUS_ATTEMPTS)
+
+        # Prepare result HTML
+        result_html = _RESULT_HTML.render({
+            "NOTICE": notice,
+            "PREVIOUS": _previous_html(previous, pronunciation),
+            "ACCURACY": int(accuracy),
+            "FLUENCY": int(fluency),
+            "PRONUNCIATION": int(pronunciation),
+            "WORDLIST": _WORD_HTML.render_many(words),
+            "MISPRONUNCIATIONS": errors["Mispronunciation"],
+            "OMISSIONS": errors["Omission"],
+            "INSERTIONS": errors["Insertion"],
+        })
 
         # Log the assessment for later analysis
-        try:
-            with wave.open(recorded_voice, "rb") as wf:
-                audio_length = wf.getnframes() / float(wf.getframerate())
-        except Exception:
-            audio_length = 0.0
+        audio_length = _audio_length(session.recorded)
 
         # Count only correctly recognized words (no errors)
         correct_words = sum(1 for word in words_list if word.get("ErrorType") == "None")
-        
-        # Update cumulative stats
-        update_stat("pronunciation_time", audio_length)
-        update_stat("words", correct_words)
-
-        recognized_text = cls.RESULT.get("Transcript") or ""
 
-        # Some card metadata for traceability
-        note = mw.reviewer.card.note() if mw.reviewer.card else None
-        card = mw.reviewer.card
-        note_id = getattr(note, "id", -1)
-        card_id = getattr(card, "id", -1)
-        field_name = getattr(cls, "FIELD", "")
-        deck_name = ""
-        try:
-            deck_name = mw.col.decks.name(card.did) if card else ""
-        except Exception:
-            deck_name = ""
-        reps = getattr(card, "reps", 0)
-        interval = getattr(card, "ivl", 0)
-
-        # record an entry in stats.json so it is easy to
-        # inspect progress over time.
-        try:
-            log_assessment({
-                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
-                "note_id": note_id,
-                "card_id": card_id,
-                "deck_name": deck_name,
-                "field_name": field_name,
-                "target_text": cls.REFTEXT,
-                "recognized_text": recognized_text,
-                "accuracy": accuracy,
-                "fluency": fluency,
-                "pronunciation_score": pronunciation,
-                "audio_length": audio_length,
-                "words_count": correct_words,
-                "mispronunciations": errors["Mispronunciation"],
-                "omissions": errors["Omission"],
-                "insertions": errors["Insertion"],
-                "reps": reps,
-                "interval": interval,
-            })
-
-            save_stats()
-        except Exception as e:
-            print(f"Error logging assessment: {e}")
-
-        # Clear RESULT to prevent reuse
-        cls.RESULT = None
+        recognized_text = result.get("Transcript") or ""
+
+        # Update daily totals and record an entry in stats.json so it
+        # is easy to inspect progress over time. The file itself is
+        # written in the background. Partial results are not recorded.
+        if not stopped:
+            try:
+                record_assessment({
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "note_id": session.note_id,
+                    "card_id": session.card_id,
+                    "deck_name": session.deck_name,
+                    "field_name": session.field_name,
+                    "target_text": session.reftext,
+                    "recognized_text": recognized_text,
+                    "accuracy": accuracy,
+                    "fluency": fluency,
+                    "pronunciation_score": pronunciation,
+                    "audio_length": audio_length,
+                    "words_count": correct_words,
+                    "mispronunciations": errors["Mispronunciation"],
+                    "omissions": errors["Omission"],
+                    "insertions": errors["Insertion"],
+                    "reps": session.reps,
+                    "interval": session.interval,
+                    "audio_id": result.get("AudioId", ""),
+                })
+
+                save_stats()
+            except Exception as e:
+                print(f"Error logging assessment: {e}")
+
+        session.html = result_html
+        session.pronunciation = pronunciation
+        session.status = "done"
+
+    @staticmethod
+    def show_result(session: AssessmentSession) -> None:
+        """Show a finished session using ResultsDialog."""
+        if session.html is None:
+            return
 
-        # Show results using ResultsDialog
         from . import ResultsDialog
-        widget = ResultsDialog(html, pronunciation)
+        widget = ResultsDialog(session)
+        # Parented to the main window, so without this every result stays alive
+        widget.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
         widget.setWindowModality(Qt.WindowModality.NonModal)
         widget.show()
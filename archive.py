@@ -0,0 +1,99 @@
+import os
+import tempfile
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+_addonpath = os.path.dirname(os.path.abspath(__file__))
+
+# Recordings are kept outside Anki's temp folder, which is wiped on start
+ARCHIVE_DIR = os.path.join(_addonpath, "archive")
+
+# Archived recordings are stored as 16 kHz mono int16, the format Vosk decodes
+SAMPLE_RATE = 16000
+
+
+def _recording_path(audio_id: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{audio_id}.npy")
+
+
+def has_recording(audio_id: str) -> bool:
+    return os.path.exists(_recording_path(audio_id))
+
+
+def store_recording(audio_id: str, samples: np.ndarray) -> str:
+    """Store samples under their content hash; identical recordings are kept once."""
+    path = _recording_path(audio_id)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=ARCHIVE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            np.save(fp, np.ascontiguousarray(samples, dtype=np.int16))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return path
+
+
+def load_recording(audio_id: str, mmap: bool = True) -> np.ndarray:
+    """Load an archived recording, memory-mapped read-only by default."""
+    return np.load(_recording_path(audio_id), mmap_mode="r" if mmap else None)
+
+
+def iter_recordings() -> Iterator[Tuple[str, np.ndarray]]:
+    """Yield ``(audio_id, samples)`` for every archived recording, memory-mapped."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return
+
+    for name in sorted(os.listdir(ARCHIVE_DIR)):
+        if name.endswith(".npy"):
+            audio_id = name[:-4]
+            yield audio_id, load_recording(audio_id)
+
+
+def store_recording_blocks(audio_id: str, blocks: Iterable[np.ndarray]) -> str:
+    """Like store_recording, but fills the file from a stream of sample blocks.
+
+    The stream is read once and written as it comes, so long recordings are
+    never held in memory. The ``.npy`` header is written with a length of 0
+    and rewritten in place once the length is known; NumPy pads the header
+    so that the length can grow without moving the data.
+    """
+    path = _recording_path(audio_id)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    header = {"descr": np.lib.format.dtype_to_descr(np.dtype("<i2")), "fortran_order": False, "shape": (0,)}
+    fd, tmp_path = tempfile.mkstemp(dir=ARCHIVE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            np.lib.format.write_array_header_1_0(fp, header)
+            data_start = fp.tell()
+
+            n_samples = 0
+            for block in blocks:
+                block = np.ascontiguousarray(block, dtype="<i2")
+                fp.write(block.tobytes())
+                n_samples += len(block)
+
+            header["shape"] = (n_samples,)
+            fp.seek(0)
+            np.lib.format.write_array_header_1_0(fp, header)
+            if fp.tell() != data_start:
+                raise ValueError("recording too long for the archive header")
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return path
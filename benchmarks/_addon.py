@@ -0,0 +1,20 @@
+"""Import add-on modules outside Anki.
+
+The add-on's __init__ needs a running Anki, so the package is registered
+without executing it and its submodules are imported directly.
+"""
+import importlib
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "ankipa_local"
+
+
+def load(name: str):
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [ADDON_DIR]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
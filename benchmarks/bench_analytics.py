@@ -0,0 +1,90 @@
+"""Timing of the columnar history queries on a synthetic history.
+
+Usage: python benchmarks/bench_analytics.py [--attempts 1000 10000 50000] [--repeat 20]
+
+The in-memory stats are replaced by generated attempts spread over a year and
+a handful of decks; nothing is written to stats.json. Prints the time to
+build the columns, to append one new attempt and to run each query.
+"""
+import argparse
+import random
+import time
+import timeit
+
+from _addon import load
+
+DECKS = ["Default", "French", "German::Verbs", "German::Nouns", "Spanish"]
+
+
+def synthetic_history(stats, attempts):
+    stats.clear()
+    start = time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1))
+    for i in range(attempts):
+        ts = start + i * 365 * 86400 / attempts
+        day = time.strftime("%d/%m/%Y", time.localtime(ts))
+        entry = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts)),
+            "card_id": random.randrange(2000),
+            "deck_name": random.choice(DECKS),
+            "accuracy": random.uniform(0, 100),
+            "fluency": random.uniform(0, 100),
+            "pronunciation_score": random.uniform(0, 100),
+            "audio_length": random.uniform(1, 6),
+            "words_count": random.randrange(10),
+            "mispronunciations": random.randrange(3),
+            "omissions": random.randrange(3),
+            "insertions": random.randrange(3),
+            "reps": random.randrange(50),
+            "interval": random.randrange(365),
+        }
+        stats.setdefault(day, {"history": []})["history"].append(entry)
+
+
+def ms(seconds, repeat=1):
+    return f"{seconds / repeat * 1e3:>9.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attempts", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    stats = load("stats")
+    analytics = load("analytics")
+
+    queries = {
+        "percentiles": lambda: analytics.percentiles(),
+        "moving_average": lambda: analytics.moving_average(),
+        "deck_trends": lambda: analytics.deck_trends(),
+        "correlation": lambda: analytics.correlation(),
+        "deck filter": lambda: analytics.percentiles(deck="French"),
+        "trends_summary": lambda: analytics.trends_summary(),
+    }
+
+    print(f"{'attempts':>9} {'load ms':>9} {'append ms':>9} " + " ".join(f"{name:>15}" for name in queries))
+    for attempts in args.attempts:
+        synthetic_history(stats.get_stats(), attempts)
+        analytics.invalidate()
+
+        t = time.perf_counter()
+        analytics.history()
+        load_time = time.perf_counter() - t
+
+        today = stats.get_stats()[max(stats.get_stats(), key=lambda d: time.strptime(d, "%d/%m/%Y"))]
+        entry = dict(today["history"][-1])
+        t = time.perf_counter()
+        today["history"].append(entry)
+        analytics._on_assessment(entry)
+        analytics.history()
+        append_time = time.perf_counter() - t
+
+        timings = [timeit.timeit(query, number=args.repeat) for query in queries.values()]
+        print(
+            f"{attempts:>9} {ms(load_time)} {ms(append_time)} "
+            + " ".join(f"{ms(seconds, args.repeat):>15}" for seconds in timings)
+        )
+
+
+if __name__ == "__main__":
+    main()
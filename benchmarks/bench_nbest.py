@@ -0,0 +1,104 @@
+"""Latency/accuracy trade-off of N-best rescoring.
+
+Usage: python benchmarks/bench_nbest.py DIR [--n 0 1 3 5 10] [--repeat 3]
+
+DIR holds WAV recordings, each next to a .txt file with the same name that
+contains its reference text and a .labels file with the expected result: one
+line per reference word, holding the word and its ErrorType (None,
+Mispronunciation or Omission) separated by a tab. speechocean.py builds such
+a set from the speechocean762 corpus.
+
+For every N, each recording is decoded from scratch and scored. The table
+shows mean latency per recording, mean accuracy score, the share of
+reference words whose ErrorType agrees with the label, and the precision
+and recall of the words flagged as errors. Rescoring is biased towards the
+reference, so a larger N should only count as better if agreement rises,
+not just the accuracy score.
+"""
+import argparse
+import os
+import statistics
+import time
+
+from _addon import load
+
+
+def read_labels(path):
+    """Return the expected ErrorType of each reference word in a .labels file."""
+    with open(path, "r", encoding="utf-8") as fp:
+        return [line.rstrip("\n").split("\t")[1] for line in fp if line.strip()]
+
+
+def _percent(part, whole):
+    return f"{100 * part / whole:.2f}" if whole else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--n", type=int, nargs="+", default=[0, 1, 3, 5, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pronunciation = load("pronunciation")
+
+    samples = []
+    for name in sorted(os.listdir(args.directory)):
+        if name.endswith(".wav"):
+            base = os.path.join(args.directory, name[:-4])
+            if os.path.exists(base + ".txt") and os.path.exists(base + ".labels"):
+                with open(base + ".txt", "r", encoding="utf-8") as fp:
+                    reference = fp.read().strip()
+                labels = read_labels(base + ".labels")
+                if len(labels) != len(pronunciation._tokenise(reference)):
+                    print(f"Skipping {name}: its labels do not match the reference words")
+                    continue
+                samples.append((base + ".wav", reference, labels))
+
+    if not samples:
+        raise SystemExit(f"No labelled .wav/.txt/.labels sets found in {args.directory}")
+
+    pronunciation.init_pronunciation_engine()
+
+    print(f"{len(samples)} recordings, {sum(len(s[2]) for s in samples)} labelled words, {args.repeat} repeats")
+    print(
+        f"{'N':>4} {'latency ms':>12} {'accuracy':>10} "
+        f"{'agreement %':>12} {'precision %':>12} {'recall %':>10}"
+    )
+
+    for n in args.n:
+        latencies = []
+        accuracies = []
+        agree = flagged = labelled = hits = total = 0
+
+        for _ in range(args.repeat):
+            for wav, reference, labels in samples:
+                # Measure decoding, not the caches
+                pronunciation._WORDS_CACHE.clear()
+                pronunciation._RESULT_CACHE.clear()
+
+                start = time.perf_counter()
+                result = pronunciation.pron_assess(reference, wav, nbest=n)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+                best = result["NBest"][0]
+                accuracies.append(best["AccuracyScore"])
+
+                # Insertions are not reference words; the rest follow the
+                # reference in order
+                predicted = [w["ErrorType"] for w in best["Words"] if w["ErrorType"] != "Insertion"]
+                for got, expected in zip(predicted, labels):
+                    total += 1
+                    agree += got == expected
+                    flagged += got != "None"
+                    labelled += expected != "None"
+                    hits += got != "None" and expected != "None"
+
+        print(
+            f"{n:>4} {statistics.mean(latencies):>12.1f} {statistics.mean(accuracies):>10.2f} "
+            f"{_percent(agree, total):>12} {_percent(hits, flagged):>12} {_percent(hits, labelled):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
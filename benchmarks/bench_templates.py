@@ -0,0 +1,79 @@
+"""Rendering micro-benchmark: chained str.replace against compiled templates.
+
+Usage: python benchmarks/bench_templates.py [--words 10 100 500] [--repeat 200]
+
+Renders a results page with the given number of words both ways and prints
+the mean time per page.
+"""
+import argparse
+import timeit
+
+from _addon import load
+
+
+def render_replace(loader, words):
+    word_html = loader.load_template("word.html")
+    html = loader.load_template("result.html")
+    html = html.replace("[ACCURACY]", "87").replace("[FLUENCY]", "64").replace("[PRONUNCIATION]", "82")
+
+    words_html = ""
+    for word, error in words:
+        words_html += (
+            word_html.replace("[WORD]", word)
+            .replace("[SYLLABLES]", "")
+            .replace("[ERROR]", error)
+            .replace("[ERROR-INFO]", error if error != "None" else "Correct")
+        )
+
+    html = html.replace("[WORDLIST]", words_html)
+    html = html.replace("[MISPRONUNCIATIONS]", "1").replace("[OMISSIONS]", "1").replace("[INSERTIONS]", "1")
+    return html
+
+
+def render_compiled(loader, words):
+    word_html = loader.compile_template("word.html")
+    result_html = loader.compile_template("result.html")
+
+    return result_html.render({
+        "ACCURACY": 87,
+        "FLUENCY": 64,
+        "PRONUNCIATION": 82,
+        "WORDLIST": word_html.render_many(
+            {
+                "WORD": word,
+                "SYLLABLES": loader.Raw(""),
+                "ERROR": error,
+                "ERROR-INFO": error if error != "None" else "Correct",
+            }
+            for word, error in words
+        ),
+        "MISPRONUNCIATIONS": 1,
+        "OMISSIONS": 1,
+        "INSERTIONS": 1,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    loader = load("templates.loader")
+    errors = ["None", "None", "None", "Mispronunciation", "Omission", "Insertion"]
+
+    print(f"{'words':>6} {'replace us':>12} {'compiled us':>12} {'speedup':>8}")
+    for n in args.words:
+        words = [(f"word{i}", errors[i % len(errors)]) for i in range(n)]
+
+        replace = timeit.timeit(lambda: render_replace(loader, words), number=args.repeat)
+        compiled = timeit.timeit(lambda: render_compiled(loader, words), number=args.repeat)
+
+        print(
+            f"{n:>6} {replace / args.repeat * 1e6:>12.1f} "
+            f"{compiled / args.repeat * 1e6:>12.1f} {replace / compiled:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
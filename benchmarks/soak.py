@@ -0,0 +1,653 @@
+"""Long-session soak test: replays assessments headless and watches for leaks.
+
+Usage: python benchmarks/soak.py [--assessments 2000] [--audio DIR] [--stats PATH]
+                                 [--sample-every 100] [--warmup 200] [thresholds]
+
+The add-on is imported with a stubbed ``aqt`` and driven like a reviewer:
+each assessment shows a card (generating its TTS, with prefetch-tts on),
+records, scores on the scheduler and opens the results dialog, which is
+then closed again. Temp files and stats.json
+are redirected into a scratch directory, so the real add-on data is only
+read.
+
+Reference texts come from the ``target_text`` values of a stats.json (the
+add-on's own by default) and from ``.txt`` files next to the fixture WAVs
+in DIR. Without DIR, short synthetic recordings are generated. Every
+replayed recording is dithered so it is never a cache hit.
+
+If the Vosk model or pyttsx3 are not installed, stand-ins are used for
+them and the report says so; latency then only covers the add-on's own
+overhead.
+
+RSS, open file descriptors, the size of the add-on's temp dir, generated
+TTS files, live dialog and web view objects, cached templates and phones and
+assessment latency are sampled every ``--sample-every`` assessments. The first sample after ``--warmup`` is
+the baseline. The exit status is 1 if any growth since the baseline exceeds
+its threshold, or if more than ``--max-failures`` assessments did not finish.
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import queue
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+import weakref
+from collections import defaultdict
+
+import numpy as np
+
+from _addon import ADDON_DIR, PACKAGE
+
+SAMPLE_RATE = 16000
+
+FALLBACK_TEXTS = [
+    "the quick brown fox jumps over the lazy dog",
+    "she sells sea shells by the sea shore",
+    "how much wood would a woodchuck chuck",
+    "sheep",
+    "a big black bug bit a big black bear",
+]
+
+
+# --- aqt stub ----------------------------------------------------------------
+
+# Live instances of every stubbed Qt class, by class name
+LIVE = defaultdict(weakref.WeakSet)
+
+
+class _StubMeta(type):
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = _Stub()
+        value._name = name
+        setattr(cls, name, value)
+        return value
+
+
+class _Stub(metaclass=_StubMeta):
+    """Accepts any call or attribute, and keeps Qt's parent/child ownership.
+
+    A widget created with a parent widget stays alive as long as the parent
+    does, unless it is closed with WA_DeleteOnClose set or deleteLater() is
+    called, as in Qt.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._children = []
+        self._parent = None
+        self._delete_on_close = False
+        if type(self) is _Stub:
+            return
+
+        LIVE[type(self).__name__].add(self)
+        parent = kwargs.get("parent")
+        if parent is None:
+            parent = next((a for a in reversed(args) if isinstance(a, _Stub) and type(a) is not _Stub), None)
+        if parent is not None:
+            self._parent = parent
+            parent._children.append(self)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = _Stub()
+        value._name = name
+        object.__setattr__(self, name, value)
+        return value
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+    def __iter__(self):
+        return iter(())
+
+    def __bool__(self):
+        return True
+
+    def setAttribute(self, attribute, on=True):
+        if getattr(attribute, "_name", "") == "WA_DeleteOnClose":
+            self._delete_on_close = on
+
+    def deleteLater(self):
+        if self._parent is not None:
+            self._parent._children.remove(self)
+            self._parent = None
+
+    def close(self):
+        if self._delete_on_close:
+            self.deleteLater()
+        return True
+
+
+class _Settings:
+    def __init__(self, *args):
+        self._values = {}
+
+    def value(self, key, default=None, defaultValue=None):
+        return self._values.get(key, default if default is not None else defaultValue)
+
+    def setValue(self, key, value):
+        self._values[key] = str(value) if isinstance(value, bool) else value
+
+
+class _TaskManager:
+    """Queues run_on_main callbacks for the harness loop, like Anki's taskman."""
+
+    def __init__(self):
+        self.main = queue.Queue()
+
+    def run_on_main(self, fn):
+        self.main.put(fn)
+
+    def run_in_background(self, fn, on_done=None):
+        def run():
+            from concurrent.futures import Future
+            future = Future()
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            if on_done is not None:
+                self.run_on_main(lambda: on_done(future))
+        threading.Thread(target=run, daemon=True).start()
+
+    def pump(self, timeout=0.0):
+        try:
+            fn = self.main.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        fn()
+        while True:
+            try:
+                fn = self.main.get_nowait()
+            except queue.Empty:
+                return True
+            fn()
+
+
+class _Note(dict):
+    def __init__(self, note_id, text):
+        super().__init__(Front=text)
+        self.id = note_id
+
+    def note_type(self):
+        return {"name": "Basic"}
+
+
+class _Card:
+    def __init__(self, card_id, text):
+        self.id = card_id
+        self.did = 1
+        self.reps = card_id % 20
+        self.ivl = card_id % 90
+        self._note = _Note(card_id, text)
+
+    def note(self):
+        return self._note
+
+
+class _Collection:
+    def __init__(self):
+        self.models = types.SimpleNamespace(field_names=lambda note_type: ["Front"])
+        self.decks = types.SimpleNamespace(name=lambda did: "Soak")
+        self.sched = types.SimpleNamespace(
+            get_queued_cards=lambda fetch_limit=1: types.SimpleNamespace(cards=[])
+        )
+
+
+class _MainWindow(_Stub):
+    pass
+
+
+def _timer_class(mw):
+    """QTimer whose single shots run on the harness loop, like Qt's event loop."""
+    return _StubMeta("QTimer", (_Stub,), {
+        "singleShot": staticmethod(lambda msec, callback: mw.taskman.run_on_main(callback)),
+    })
+
+
+class _RecordDialog:
+    """Stands in for aqt.sound.RecordDialog; the harness "records" by calling back."""
+
+    last = None
+
+    def __init__(self, parent, mw, on_success):
+        self.on_success = on_success
+        _RecordDialog.last = self
+
+
+def _stub_module(name, **attributes):
+    module = types.ModuleType(name)
+
+    def __getattr__(attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        cls = _StubMeta(attr, (_Stub,), {})
+        setattr(module, attr, cls)
+        return cls
+
+    module.__getattr__ = __getattr__
+    for key, value in attributes.items():
+        setattr(module, key, value)
+    sys.modules[name] = module
+    return module
+
+
+def install_aqt_stub():
+    mw = _MainWindow()
+    mw.taskman = _TaskManager()
+    mw.col = _Collection()
+    mw.reviewer = _Stub()
+    mw.reviewer.card = None
+
+    aqt = _stub_module("aqt", mw=mw, gui_hooks=_Stub())
+    aqt.__path__ = []
+    aqt.qt = _stub_module("aqt.qt", QSettings=_Settings, QTimer=_timer_class(mw))
+    aqt.sound = _stub_module("aqt.sound", RecordDialog=_RecordDialog)
+    aqt.utils = _stub_module("aqt.utils")
+    aqt.webview = _stub_module("aqt.webview")
+    return mw
+
+
+# --- dependency stand-ins -----------------------------------------------------
+
+class _StandInState:
+    reference = ""
+    decode_ms = 0.0
+
+
+class _StandInRecognizer:
+    """Emits the current reference words, with some errors, instead of decoding."""
+
+    def __init__(self, *args):
+        self._words = _StandInState.reference.split() or ["hello"]
+        self._pending = []
+        self._index = 0
+        self._time = 0.0
+        self._alternatives = 0
+
+    def SetWords(self, value):
+        pass
+
+    def SetMaxAlternatives(self, n):
+        self._alternatives = n
+
+    def AcceptWaveform(self, data):
+        seconds = len(data) / 2 / SAMPLE_RATE
+        if _StandInState.decode_ms:
+            time.sleep(seconds * _StandInState.decode_ms / 1000.0)
+        self._time += seconds
+        if self._index < len(self._words) and random.random() < 0.6:
+            word = self._words[self._index] if random.random() < 0.85 else "uh"
+            self._pending.append({"word": word, "start": self._time, "end": self._time + 0.3, "conf": 0.9})
+            self._index += 1
+        return len(self._pending) >= 4
+
+    def _flush(self):
+        words, self._pending = self._pending, []
+        if self._alternatives:
+            return json.dumps({"alternatives": [{"result": words}, {"result": words[:-1]}] if words else []})
+        return json.dumps({"result": words, "text": " ".join(w["word"] for w in words)})
+
+    def Result(self):
+        return self._flush()
+
+    def FinalResult(self):
+        return self._flush()
+
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+
+
+def _install_pyttsx3_stand_in():
+    class Engine:
+        def getProperty(self, name):
+            return [types.SimpleNamespace(id="en")] if name == "voices" else None
+
+        def setProperty(self, name, value):
+            pass
+
+        def save_to_file(self, text, path):
+            self._job = (text, path)
+
+        def runAndWait(self):
+            text, path = self._job
+            _write_wav(path, np.zeros(int(SAMPLE_RATE * 0.08 * max(1, len(text.split()))), dtype=np.int16))
+
+        def stop(self):
+            pass
+
+    sys.modules["pyttsx3"] = types.SimpleNamespace(init=lambda: Engine())
+
+
+def _install_bootstrapper():
+    """Check dependencies without ever installing anything."""
+    module = types.ModuleType(f"{PACKAGE}.bootstrapper")
+
+    def ensure_dependencies():
+        for package in ("pyttsx3", "vosk", "rapidfuzz", "scipy", "numpy", "eng_to_ipa"):
+            try:
+                __import__(package)
+            except ImportError:
+                return False
+        return True
+
+    module.ensure_dependencies = ensure_dependencies
+    sys.modules[module.__name__] = module
+
+
+def load_addon():
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(ADDON_DIR, "__init__.py"), submodule_search_locations=[ADDON_DIR]
+    )
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = addon
+    spec.loader.exec_module(addon)
+    return addon
+
+
+# --- workload -----------------------------------------------------------------
+
+def _write_wav(path, samples, rate=SAMPLE_RATE):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+
+
+def _read_wav(path):
+    with wave.open(path, "rb") as w:
+        nchannels, sampwidth, rate, nframes, _, _ = w.getparams()
+        frames = w.readframes(nframes)
+    if sampwidth != 2:
+        raise ValueError(f"{path}: only 16-bit WAV fixtures are supported")
+    samples = np.frombuffer(frames, dtype=np.int16)
+    if nchannels > 1:
+        samples = samples.reshape(-1, nchannels).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+
+def _synthetic_recording(text, rng):
+    seconds = 0.8 + 0.35 * len(text.split()) * rng.uniform(0.8, 1.3)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = np.sin(2 * np.pi * 2.5 * t) > -0.2
+    tone = np.sin(2 * np.pi * (150 + 40 * np.sin(2 * np.pi * 4 * t)) * t)
+    return ((tone * 6000 + rng.normal(0, 800, len(t))) * voiced).astype(np.int16), SAMPLE_RATE
+
+
+def load_workload(audio_dir, stats_path):
+    fixtures = []
+    if audio_dir:
+        for name in sorted(os.listdir(audio_dir)):
+            if name.endswith(".wav"):
+                samples, rate = _read_wav(os.path.join(audio_dir, name))
+                txt = os.path.join(audio_dir, name[:-4] + ".txt")
+                text = None
+                if os.path.exists(txt):
+                    with open(txt, "r", encoding="utf-8") as fp:
+                        text = fp.read().strip()
+                fixtures.append((samples, rate, text))
+
+    texts = [text for _, _, text in fixtures if text]
+    if stats_path and os.path.exists(stats_path):
+        with open(stats_path, "r", encoding="utf-8") as fp:
+            for day in json.load(fp).values():
+                if isinstance(day, dict):
+                    texts.extend(e.get("target_text") for e in day.get("history", []) if e.get("target_text"))
+
+    return fixtures, texts or list(FALLBACK_TEXTS)
+
+
+def vary_texts(texts, minimum, rng):
+    """Add sentences made of the workload's own words until ``minimum`` texts differ.
+
+    More distinct texts than TTS.MAX_FILES make TTS cleanup run, while the
+    vocabulary, and so the phone cache, stays the same.
+    """
+    distinct = list(dict.fromkeys(texts))
+    vocabulary = sorted({word for text in distinct + FALLBACK_TEXTS for word in text.lower().split()})
+    while len(distinct) < minimum:
+        sentence = " ".join(rng.choice(vocabulary, size=6))
+        if sentence not in distinct:
+            distinct.append(sentence)
+    return texts + distinct[len(set(texts)):]
+
+
+# --- measurements -------------------------------------------------------------
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def open_fds():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(path):
+            return len(os.listdir(path))
+    return None
+
+
+def tts_files(path):
+    try:
+        return sum(1 for name in os.listdir(path) if name.startswith("tts-") and name.endswith(".wav"))
+    except OSError:
+        return 0
+
+
+def dir_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--assessments", type=int, default=2000)
+    parser.add_argument("--audio", help="directory of fixture .wav files, with optional .txt references")
+    parser.add_argument("--stats", default=os.path.join(ADDON_DIR, "stats.json"),
+                        help="stats.json to take target_text values from")
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for one assessment")
+    parser.add_argument("--decode-ms", type=float, default=0.0,
+                        help="simulated decode time per audio second when the Vosk model is missing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-texts", type=int, default=48,
+                        help="distinct reference texts, padded with sentences from the workload's words")
+    parser.add_argument("--max-rss-growth", type=float, default=64.0, help="MB")
+    parser.add_argument("--max-fd-growth", type=int, default=8)
+    parser.add_argument("--max-tmp-growth", type=float, default=32.0, help="MB")
+    parser.add_argument("--max-live-widgets", type=int, default=4,
+                        help="growth in live results dialogs and web views")
+    parser.add_argument("--max-latency-drift", type=float, default=1.5,
+                        help="ratio of the last to the first median latency window")
+    parser.add_argument("--max-failures", type=int, default=0,
+                        help="assessments allowed to fail or time out")
+    parser.add_argument("--max-template-growth", type=int, default=0,
+                        help="growth in templates held by the load_template cache")
+    parser.add_argument("--max-phone-growth", type=int, default=256,
+                        help="growth in words held by the _get_phones cache")
+    parser.add_argument("--latency-slack", type=float, default=5.0,
+                        help="ms of median latency growth always tolerated, for runs with tiny latencies")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    fixtures, texts = load_workload(args.audio, args.stats)
+    texts = vary_texts(texts, args.min_texts, rng)
+
+    workdir = tempfile.mkdtemp(prefix="ankipa_soak_")
+    tempfile.tempdir = os.path.join(workdir, "tmp")
+    os.makedirs(tempfile.tempdir)
+    addon_tmp = os.path.join(tempfile.tempdir, "ankipa")
+
+    notes = []
+    try:
+        import pyttsx3  # noqa: F401
+    except ImportError:
+        _install_pyttsx3_stand_in()
+        notes.append("tts: stand-in (pyttsx3 not installed)")
+
+    mw = install_aqt_stub()
+    _install_bootstrapper()
+    addon = load_addon()
+    # Generate TTS for every shown card, so its temp files are exercised
+    addon.app_settings.setValue("prefetch-tts", True)
+
+    stats = sys.modules[f"{PACKAGE}.stats"]
+    stats._addonpath = workdir
+
+    from importlib import import_module
+    pronunciation = import_module(f"{PACKAGE}.pronunciation")
+    loader = import_module(f"{PACKAGE}.templates.loader")
+    tts = import_module(f"{PACKAGE}.tts")
+    try:
+        pronunciation.init_pronunciation_engine()
+        notes.append("decoder: Vosk")
+    except Exception as e:
+        pronunciation.init_pronunciation_engine = lambda: None
+        pronunciation.new_recognizer = lambda: _StandInRecognizer()
+        _StandInState.decode_ms = args.decode_ms
+        notes.append(f"decoder: stand-in ({e})")
+
+    AnkiPA = addon.AnkiPA
+    # The session of the current take, as first reported by the scheduler
+    take = {}
+    AnkiPA.SCHEDULER.add_listener(lambda session: take.setdefault("session", session))
+    recording = os.path.join(workdir, "rec.wav")
+
+    print(f"{args.assessments} assessments, {len(fixtures)} fixture recordings, {len(texts)} reference texts")
+    for note in notes:
+        print(f"  {note}")
+    print(f"  scratch dir: {workdir}")
+    print()
+    print(f"{'n':>6} {'rss MB':>8} {'fds':>5} {'tmp MB':>7} {'tts':>4} {'dialogs':>8} {'webviews':>9} "
+          f"{'history':>8} {'phones':>7} {'tmpl':>5} {'p50 ms':>7} {'p95 ms':>7}")
+
+    samples_log = []
+    latencies = []
+    window = []
+    failures = 0
+
+    try:
+        for i in range(1, args.assessments + 1):
+            if fixtures:
+                samples, rate, text = fixtures[i % len(fixtures)]
+                text = text or texts[i % len(texts)]
+            else:
+                text = random.choice(texts)
+                samples, rate = _synthetic_recording(text, rng)
+            # Dither so every take is a new recording, as in a real session
+            dithered = np.clip(samples.astype(np.int32) + rng.integers(-1, 2, len(samples)), -32768, 32767)
+            _write_wav(recording, dithered, rate)
+            _StandInState.reference = text.lower()
+
+            card = _Card(100000 + i % 500, text)
+            mw.reviewer.card = card
+            AnkiPA.PREFETCH.on_question_shown(card)
+            # The learner reads the question while queued main-thread work runs
+            mw.taskman.pump()
+            AnkiPA.test_pronunciation()
+
+            take.clear()
+            start = time.perf_counter()
+            _RecordDialog.last.on_success(recording)
+            session = take["session"]
+            deadline = start + args.timeout
+            while session.status in ("recording", "scoring") and time.perf_counter() < deadline:
+                mw.taskman.pump(timeout=0.05)
+            mw.taskman.pump()
+            elapsed = (time.perf_counter() - start) * 1000
+            if session.status != "done":
+                failures += 1
+
+            latencies.append(elapsed)
+            window.append(elapsed)
+
+            # The learner closes every results dialog that popped up
+            for dialog in list(LIVE["ResultsDialog"]):
+                dialog.close()
+
+            if i % args.sample_every == 0 or i == args.assessments:
+                stats.flush_stats()
+                # Closed dialogs hold reference cycles with their children
+                gc.collect()
+                sample = {
+                    "n": i,
+                    "rss": rss_mb(),
+                    "fds": open_fds(),
+                    "tmp": dir_mb(addon_tmp),
+                    "tts": tts_files(addon_tmp),
+                    "dialogs": len(LIVE["ResultsDialog"]),
+                    "webviews": len(LIVE["AnkiWebView"]),
+                    "history": sum(len(d.get("history", [])) for d in stats.get_stats().values()),
+                    "phones": pronunciation._get_phones.cache_info().currsize,
+                    "templates": loader.load_template.cache_info().currsize,
+                    "p50": statistics.median(window),
+                    "p95": float(np.percentile(window, 95)),
+                }
+                samples_log.append(sample)
+                window = []
+                print(f"{i:>6} {sample['rss']:>8.1f} {sample['fds'] if sample['fds'] is not None else '-':>5} "
+                      f"{sample['tmp']:>7.2f} {sample['tts']:>4} {sample['dialogs']:>8} {sample['webviews']:>9} "
+                      f"{sample['history']:>8} {sample['phones']:>7} {sample['templates']:>5} {sample['p50']:>7.1f} {sample['p95']:>7.1f}")
+    finally:
+        AnkiPA.PREFETCH.clear()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = next((s for s in samples_log if s["n"] >= args.warmup), samples_log[0])
+    last = samples_log[-1]
+
+    checks = [
+        ("RSS growth (MB)", last["rss"] - baseline["rss"], args.max_rss_growth),
+        ("temp dir growth (MB)", last["tmp"] - baseline["tmp"], args.max_tmp_growth),
+        ("live results dialogs", last["dialogs"] - baseline["dialogs"], args.max_live_widgets),
+        ("live web views", last["webviews"] - baseline["webviews"], args.max_live_widgets),
+        ("cached templates", last["templates"] - baseline["templates"], args.max_template_growth),
+        ("cached phones", last["phones"] - baseline["phones"], args.max_phone_growth),
+        ("TTS files", max(s["tts"] for s in samples_log), tts.TTS.MAX_FILES),
+        ("failed assessments", failures, args.max_failures),
+    ]
+    drift = last["p50"] / baseline["p50"] if baseline["p50"] else 1.0
+    if last["p50"] - baseline["p50"] > args.latency_slack:
+        checks.append(("latency drift (x)", drift, args.max_latency_drift))
+    else:
+        checks.append(("latency drift (x)", drift, max(drift, args.max_latency_drift)))
+    if last["fds"] is not None and baseline["fds"] is not None:
+        checks.append(("open file growth", last["fds"] - baseline["fds"], args.max_fd_growth))
+
+    print()
+    print(f"baseline at {baseline['n']}, {failures} assessments did not finish as done")
+    failed = False
+    for name, value, limit in checks:
+        ok = value <= limit
+        failed |= not ok
+        print(f"  {'ok  ' if ok else 'FAIL'} {name:<22} {value:>9.2f}  (limit {limit:g})")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
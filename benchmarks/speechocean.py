@@ -0,0 +1,61 @@
+"""Build a bench_nbest.py fixture set from the speechocean762 corpus.
+
+Usage: python benchmarks/speechocean.py CORPUS OUT [--split test] [--limit 200] [--threshold 6]
+
+speechocean762 (OpenSLR resource 101) holds read English sentences by
+non-native speakers, each word scored 0-10 for accuracy by expert raters.
+CORPUS is the unpacked corpus, with its WAVE/, train/, test/ and resource/
+directories. For every utterance of the split, OUT gets NAME.wav, NAME.txt
+with the sentence and NAME.labels with one line per word: the word and its
+expected ErrorType. Words the raters scored below the threshold are labelled
+Mispronunciation, all others None, matching the 60/100 cut-off used when
+scoring. The corpus has no omission labels.
+"""
+import argparse
+import json
+import os
+import shutil
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus")
+    parser.add_argument("out")
+    parser.add_argument("--split", choices=["train", "test"], default="test")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--threshold", type=int, default=6)
+    args = parser.parse_args()
+
+    with open(os.path.join(args.corpus, "resource", "scores.json"), "r", encoding="utf-8") as fp:
+        scores = json.load(fp)
+
+    wavs = {}
+    with open(os.path.join(args.corpus, args.split, "wav.scp"), "r", encoding="utf-8") as fp:
+        for line in fp:
+            if line.strip():
+                utt, path = line.split(None, 1)
+                wavs[utt] = os.path.join(args.corpus, path.strip())
+
+    os.makedirs(args.out, exist_ok=True)
+    written = 0
+    flagged = 0
+    for utt in sorted(wavs)[: args.limit]:
+        if utt not in scores:
+            continue
+        words = scores[utt]["words"]
+
+        shutil.copyfile(wavs[utt], os.path.join(args.out, utt + ".wav"))
+        with open(os.path.join(args.out, utt + ".txt"), "w", encoding="utf-8") as fp:
+            fp.write(" ".join(w["text"] for w in words).lower() + "\n")
+        with open(os.path.join(args.out, utt + ".labels"), "w", encoding="utf-8") as fp:
+            for w in words:
+                error = "Mispronunciation" if w["accuracy"] < args.threshold else "None"
+                flagged += error != "None"
+                fp.write(f"{w['text'].lower()}\t{error}\n")
+        written += 1
+
+    print(f"{written} recordings written to {args.out}, {flagged} words labelled Mispronunciation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import Optional
+
+
+class AssessmentStopped(Exception):
+    """Raised between audio chunks once an assessment was cancelled or ran out of time.
+
+    ``recognised`` holds whatever was decoded before stopping, in the same
+    shape the interrupted decoder would have returned.
+    """
+
+    def __init__(self, reason: str, recognised=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.recognised = recognised
+
+
+class Deadline:
+    """Cancellation flag with an optional time limit, shared by one assessment.
+
+    The clock only runs once start() is called, so time spent waiting in the
+    scheduler queue does not count. cancel() may be called from any thread.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self._cancelled = threading.Event()
+        self.seconds = seconds
+        self.expires: Optional[float] = None
+
+    def start(self):
+        if self.seconds:
+            self.expires = time.monotonic() + self.seconds
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def reason(self) -> Optional[str]:
+        """"cancelled" or "timeout" once the assessment should stop, else None."""
+        if self._cancelled.is_set():
+            return "cancelled"
+        if self.expires is not None and time.monotonic() >= self.expires:
+            return "timeout"
+        return None
+
+    def check(self, recognised=None):
+        """Raise AssessmentStopped, carrying ``recognised``, if the assessment should stop."""
+        reason = self.reason
+        if reason is not None:
+            raise AssessmentStopped(reason, recognised)
@@ -0,0 +1,119 @@
+import json
+from typing import List, Optional
+
+import numpy as np
+
+from aqt.qt import QTimer
+
+# How far ahead in the reference a heard word may match, so a couple of
+# missed or misrecognised words do not stall the endpointer
+_MATCH_AHEAD = 3
+_POLL_MS = 100
+
+
+class AutoStop:
+    """Stops a RecordDialog once the whole reference was read and the speaker pauses.
+
+    Every _POLL_MS the audio recorded so far is fed to a live recognizer
+    restricted to the reference words. Once the last reference word has been
+    heard and the input has stayed quiet for ``silence_ms``, the dialog is
+    accepted, which stops recording and starts scoring right away.
+    """
+
+    def __init__(self, dialog, tokens: List[str], silence_ms: int = 800):
+        self.dialog = dialog
+        self.reference = [t.lower() for t in tokens]
+        self.silence_ms = silence_ms
+
+        self._recorder = getattr(dialog, "_recorder", None)
+        self._rec = None
+        self._offset = 0
+        self._channels = 1
+        self._heard: List[str] = []
+        self._partial: List[str] = []
+        self._peak = 0.0
+        self._quiet_ms = 0.0
+
+        self._timer = QTimer(dialog)
+        self._timer.timeout.connect(self._poll)
+
+    @classmethod
+    def attach(cls, dialog, tokens: List[str], silence_ms: int = 800) -> Optional["AutoStop"]:
+        """Start auto-stop for a dialog; returns None if it cannot be supported."""
+        if not tokens:
+            return None
+
+        auto_stop = cls(dialog, tokens, silence_ms)
+        try:
+            # Only Qt's audio input recorder exposes the live buffer
+            if not hasattr(auto_stop._recorder, "_buffer"):
+                raise RuntimeError("recorder does not expose live audio")
+            audio_format = auto_stop._recorder._format
+            if audio_format.sampleFormat() != audio_format.SampleFormat.Int16:
+                raise RuntimeError("recorder does not record 16-bit samples")
+            auto_stop._channels = max(audio_format.channelCount(), 1)
+            rate = audio_format.sampleRate()
+            from .pronunciation import live_recognizer
+            auto_stop._rec = live_recognizer(rate, tokens)
+        except Exception as e:
+            print(f"[AnkiPA] Auto-stop unavailable: {e}")
+            return None
+
+        # Qt does not hold a Python reference to us, the dialog does
+        dialog._ankipa_auto_stop = auto_stop
+        dialog.finished.connect(auto_stop.stop)
+        auto_stop._timer.start(_POLL_MS)
+        return auto_stop
+
+    def stop(self, *args):
+        self._timer.stop()
+        self._rec = None
+
+    def covered(self) -> int:
+        """Number of reference words read so far, in order."""
+        pointer = 0
+        for word in self._heard + self._partial:
+            ahead = self.reference[pointer:pointer + _MATCH_AHEAD]
+            if word in ahead:
+                pointer += ahead.index(word) + 1
+                if pointer == len(self.reference):
+                    break
+        return pointer
+
+    def _poll(self):
+        if self._rec is None:
+            return
+
+        buffer = getattr(self._recorder, "_buffer", None)
+        if buffer is None or len(buffer) <= self._offset:
+            return
+
+        # Keep whole frames only: one int16 sample per channel
+        frame = 2 * self._channels
+        end = len(buffer) - (len(buffer) - self._offset) % frame
+        if end <= self._offset:
+            return
+        samples = np.frombuffer(bytes(buffer[self._offset:end]), dtype=np.int16)
+        self._offset = end
+
+        # The recognizer expects mono
+        if self._channels > 1:
+            samples = samples.reshape(-1, self._channels).mean(axis=1).astype(np.int16)
+
+        if self._rec.AcceptWaveform(samples.tobytes()):
+            self._heard.extend(json.loads(self._rec.Result()).get("text", "").split())
+            self._partial = []
+        else:
+            self._partial = json.loads(self._rec.PartialResult()).get("partial", "").split()
+
+        samples = samples.astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        self._peak = max(self._peak, rms)
+        if rms < 0.1 * self._peak:
+            self._quiet_ms += len(samples) * 1000.0 / self._recorder._format.sampleRate()
+        else:
+            self._quiet_ms = 0.0
+
+        if self.covered() == len(self.reference) and self._quiet_ms >= self.silence_ms:
+            self.stop()
+            self.dialog.accept()
@@ -0,0 +1,284 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import date
+from typing import Callable, Iterable, Iterator, Optional
+
+from .stats import flush_stats, get_stats
+
+# Column order and NumPy dtype of each history field
+HISTORY_COLUMNS = {
+    "timestamp": "datetime64[s]",
+    "note_id": "int64",
+    "card_id": "int64",
+    "deck_name": "U",
+    "field_name": "U",
+    "target_text": "U",
+    "recognized_text": "U",
+    "accuracy": "float64",
+    "fluency": "float64",
+    "pronunciation_score": "float64",
+    "audio_length": "float64",
+    "words_count": "int64",
+    "mispronunciations": "int64",
+    "omissions": "int64",
+    "insertions": "int64",
+    "reps": "int64",
+    "interval": "int64",
+    "audio_id": "U",
+}
+
+_COLUMNAR_CHUNK = 4096
+
+
+def _parse_day(day: str) -> Optional[date]:
+    try:
+        parsed = time.strptime(day, "%d/%m/%Y")
+    except ValueError:
+        return None
+    return date(parsed.tm_year, parsed.tm_mon, parsed.tm_mday)
+
+
+def iter_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    deck: Optional[str] = None,
+    card_id: Optional[int] = None,
+) -> Iterator[dict]:
+    """Yield history entries in date order, filtered by day range, deck and card.
+
+    Each day's list is copied before iterating, so the stats may keep being
+    updated while an export is running.
+    """
+    stats = get_stats()
+    days = []
+    for key in list(stats.keys()):
+        day = _parse_day(key)
+        if day is None:
+            continue
+        if (start is not None and day < start) or (end is not None and day > end):
+            continue
+        days.append((day, key))
+
+    for _, key in sorted(days):
+        for entry in list(stats.get(key, {}).get("history", [])):
+            if deck is not None and entry.get("deck_name") != deck:
+                continue
+            if card_id is not None and entry.get("card_id") != card_id:
+                continue
+            yield entry
+
+
+def _row(entry: dict) -> dict:
+    return {name: entry.get(name, "") for name in HISTORY_COLUMNS}
+
+
+def write_csv(path: str, rows: Iterable[dict]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=list(HISTORY_COLUMNS))
+        writer.writeheader()
+        for entry in rows:
+            writer.writerow(_row(entry))
+            count += 1
+    return count
+
+
+def write_jsonl(path: str, rows: Iterable[dict]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as fp:
+        for entry in rows:
+            fp.write(json.dumps(_row(entry), ensure_ascii=False))
+            fp.write("\n")
+            count += 1
+    return count
+
+
+def write_columnar(path: str, rows: Callable[[], Iterable[dict]]) -> int:
+    """Write one ``.npy`` column per field into an uncompressed ``.npz`` archive.
+
+    ``rows`` is called twice: once to size the columns and once to fill them.
+    Columns are filled through memory-mapped temp files, so memory use does not
+    grow with the number of rows, and the result loads with ``np.load``. If
+    the second pass yields fewer rows, e.g. because the history cap trimmed
+    today's entries meanwhile, the columns are cut to the rows written.
+    """
+    import numpy as np
+
+    count = 0
+    widths = {name: 1 for name, dtype in HISTORY_COLUMNS.items() if dtype == "U"}
+    for entry in rows():
+        count += 1
+        for name in widths:
+            widths[name] = max(widths[name], len(str(entry.get(name, ""))))
+
+    dtypes = {
+        name: np.dtype(f"U{widths[name]}" if dtype == "U" else dtype)
+        for name, dtype in HISTORY_COLUMNS.items()
+    }
+
+    tmpdir = tempfile.mkdtemp(prefix="ankipa_export_")
+    try:
+        columns = {}
+        for name, dtype in dtypes.items():
+            column_path = os.path.join(tmpdir, f"{name}.npy")
+            if count:
+                columns[name] = np.lib.format.open_memmap(column_path, mode="w+", dtype=dtype, shape=(count,))
+            else:
+                np.save(column_path, np.empty(0, dtype=dtype))
+
+        def fill(offset, chunk):
+            for name, column in columns.items():
+                values = [entry.get(name) for entry in chunk]
+                if dtypes[name].kind == "M":
+                    values = [v or "NaT" for v in values]
+                elif dtypes[name].kind == "U":
+                    values = ["" if v is None else str(v) for v in values]
+                else:
+                    values = [0 if v in (None, "") else v for v in values]
+                column[offset:offset + len(chunk)] = np.asarray(values, dtype=dtypes[name])
+
+        if count:
+            offset = 0
+            chunk = []
+            for entry in rows():
+                if offset + len(chunk) >= count:
+                    break
+                chunk.append(entry)
+                if len(chunk) == _COLUMNAR_CHUNK:
+                    fill(offset, chunk)
+                    offset += len(chunk)
+                    chunk = []
+            if chunk:
+                fill(offset, chunk)
+                offset += len(chunk)
+
+            for column in columns.values():
+                column.flush()
+            columns.clear()
+
+            if offset < count:
+                # Never leave zero-filled rows behind
+                for name in dtypes:
+                    column_path = os.path.join(tmpdir, f"{name}.npy")
+                    short_path = os.path.join(tmpdir, f"{name}.short.npy")
+                    np.save(short_path, np.load(column_path, mmap_mode="r")[:offset])
+                    os.replace(short_path, column_path)
+                count = offset
+
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for name in dtypes:
+                zf.write(os.path.join(tmpdir, f"{name}.npy"), arcname=f"{name}.npy")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return count
+
+
+def history_decks() -> list:
+    """Sorted names of the decks that appear in the history."""
+    try:
+        from .analytics import deck_names
+    except ImportError:
+        return sorted({entry.get("deck_name", "") for entry in iter_history()} - {""})
+    return deck_names()
+
+
+def write_deck_trends(path: str, **filters) -> int:
+    """Write one row per deck with attempts, mean scores and improvement per day."""
+    from .analytics import SCORE_COLUMNS, correlation, deck_trends, percentiles
+
+    decks = {}
+    for column in SCORE_COLUMNS:
+        for trend in deck_trends(column, min_attempts=1, **filters):
+            row = decks.setdefault(trend["deck"], {"deck": trend["deck"], "attempts": trend["attempts"]})
+            row[f"{column}_mean"] = trend["mean"]
+            row[f"{column}_slope"] = trend["slope"]
+
+    # Per-deck percentiles and correlation take a filtered pass per deck
+    deck_filters = {name: value for name, value in filters.items() if name != "deck"}
+    for name, row in decks.items():
+        median = percentiles("pronunciation_score", (50,), deck=name, **deck_filters)[50]
+        row["pronunciation_score_median"] = None if median is None else round(median, 2)
+        row["interval_correlation"] = correlation("pronunciation_score", "interval", deck=name, **deck_filters)
+
+    fields = ["deck", "attempts"]
+    for column in SCORE_COLUMNS:
+        fields += [f"{column}_mean", f"{column}_slope"]
+    fields += ["pronunciation_score_median", "interval_correlation"]
+
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=fields)
+        writer.writeheader()
+        for row in decks.values():
+            writer.writerow(row)
+    return sum(row["attempts"] for row in decks.values())
+
+
+# Stored scores and scores re-computed from the archived recording, side by side
+RESCORED_COLUMNS = (
+    "timestamp", "card_id", "deck_name", "target_text", "audio_id",
+    "accuracy", "fluency", "pronunciation_score", "recognized_text",
+    "new_accuracy", "new_fluency", "new_pronunciation_score", "new_recognized_text",
+)
+
+
+def write_rescored(path: str, rows: Iterable[dict], parallel=False, nbest=0, deadline=None) -> int:
+    """Re-score archived recordings with the current scorer and write old and new scores.
+
+    Rows without an archived recording are left out. Stops early once
+    ``deadline`` is cancelled, keeping the rows written so far.
+    """
+    from .pronunciation import rescore_history
+
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=list(RESCORED_COLUMNS))
+        writer.writeheader()
+        for entry, result in rescore_history(rows, parallel, nbest, deadline):
+            row = {name: entry.get(name, "") for name in RESCORED_COLUMNS}
+            scores = result["NBest"][0]
+            row["new_accuracy"] = scores["AccuracyScore"]
+            row["new_fluency"] = scores["FluencyScore"]
+            row["new_pronunciation_score"] = scores["PronScore"]
+            row["new_recognized_text"] = result.get("Transcript", "")
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+EXPORT_FORMATS = {
+    "csv": "CSV Files (*.csv)",
+    "jsonl": "JSON Lines Files (*.jsonl)",
+    "npz": "NumPy Column Files (*.npz)",
+    "json": "JSON Files (*.json)",
+    "decks": "Deck Trends CSV (*.csv)",
+    "rescored": "Re-scored from Archive CSV (*.csv)",
+}
+
+
+def export_history(path: str, fmt: str, rescore: Optional[dict] = None, **filters) -> int:
+    """Export filtered history rows to ``path``; returns the number of rows written.
+
+    The ``json`` format writes the raw stats file and ignores the filters.
+    ``rescore`` holds the write_rescored options for the ``rescored`` format.
+    """
+    if fmt == "csv":
+        return write_csv(path, iter_history(**filters))
+    if fmt == "jsonl":
+        return write_jsonl(path, iter_history(**filters))
+    if fmt == "npz":
+        return write_columnar(path, lambda: iter_history(**filters))
+    if fmt == "decks":
+        return write_deck_trends(path, **filters)
+    if fmt == "rescored":
+        return write_rescored(path, iter_history(**filters), **(rescore or {}))
+    if fmt == "json":
+        flush_stats()
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "stats.json"), path)
+        return sum(len(day.get("history", [])) for day in get_stats().values())
+    raise ValueError(f"Unknown export format: {fmt}")
@@ -0,0 +1,151 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aqt import mw
+from aqt.qt import QTimer
+
+# Delay before generating TTS for the shown card, so the question is drawn first
+_TTS_DELAY_MS = 300
+
+
+class PreparedCard:
+    """Work done for a card before the user asks for an assessment."""
+
+    def __init__(self, card_id: int, reftext: str):
+        self.card_id = card_id
+        self.reftext = reftext
+        self.tokens: Optional[List[str]] = None
+        # Unused recognizer, only primed for the card being shown
+        self.recognizer = None
+        self.tts_path: Optional[str] = None
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.recognizer = None
+
+
+class PrefetchScheduler:
+    """Prepares the shown card and the next due cards while the learner reads.
+
+    Hooked to the reviewer's question-shown event. Preparation runs on a
+    single background thread; when the reviewer moves on, work for cards that
+    are no longer upcoming is cancelled and dropped.
+
+    TTS is only generated ahead when the prefetch-tts setting is on, and only
+    for the shown card. Some TTS drivers need the main thread (SAPI5's COM
+    objects, the macOS run loop), so it runs there, as replaying TTS does.
+    """
+
+    def __init__(self, card_reference: Callable[[object], Tuple[str, str]], depth: int = 3):
+        self.depth = depth
+        self._card_reference = card_reference
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AnkiPA prefetch")
+        self._prepared: Dict[int, PreparedCard] = {}
+        self._lock = threading.Lock()
+
+    def on_question_shown(self, card) -> None:
+        """reviewer_did_show_question hook, called on the main thread."""
+        # The collection is only safe to use from the main thread, so the
+        # texts are read here and only the heavy lifting is deferred.
+        targets = []
+        for upcoming in [card] + self._next_cards(card):
+            try:
+                _, text = self._card_reference(upcoming)
+            except Exception:
+                continue
+            if text:
+                targets.append((upcoming.id, text))
+
+        wanted = dict(targets)
+        jobs = []
+
+        with self._lock:
+            for card_id, prepared in list(self._prepared.items()):
+                if wanted.get(card_id) != prepared.reftext:
+                    prepared.cancel()
+                    del self._prepared[card_id]
+
+            for index, (card_id, text) in enumerate(targets):
+                prepared = self._prepared.get(card_id)
+                if prepared is None:
+                    prepared = self._prepared[card_id] = PreparedCard(card_id, text)
+                jobs.append((prepared, index == 0))
+
+        for prepared, current in jobs:
+            self._executor.submit(self._prepare, prepared, current)
+            if current and card.id == prepared.card_id and self._tts_wanted():
+                QTimer.singleShot(_TTS_DELAY_MS, lambda prepared=prepared: self._prepare_tts(prepared))
+
+    def take(self, card_id: int, reftext: str) -> Optional[PreparedCard]:
+        """Hand over the prepared work for a card, if it matches the reference."""
+        with self._lock:
+            prepared = self._prepared.get(card_id)
+            if prepared is None or prepared.reftext != reftext:
+                return None
+            del self._prepared[card_id]
+            return prepared
+
+    def clear(self, *args) -> None:
+        """Cancel and drop all prepared work, e.g. when the reviewer closes."""
+        with self._lock:
+            for prepared in self._prepared.values():
+                prepared.cancel()
+            self._prepared.clear()
+
+    def _next_cards(self, card) -> list:
+        try:
+            queued = mw.col.sched.get_queued_cards(fetch_limit=self.depth + 1)
+        except Exception:
+            return []
+
+        cards = []
+        for queued_card in queued.cards:
+            card_id = queued_card.card.id
+            if card_id == card.id:
+                continue
+            try:
+                cards.append(mw.col.get_card(card_id))
+            except Exception:
+                continue
+            if len(cards) >= self.depth:
+                break
+        return cards
+
+    @staticmethod
+    def _prepare(prepared: PreparedCard, current: bool) -> None:
+        if prepared.cancelled.is_set():
+            return
+
+        try:
+            from .pronunciation import new_recognizer, prepare_reference
+        except Exception:
+            # Dependencies are missing; assessments will report it
+            return
+
+        try:
+            if prepared.tokens is None:
+                prepared.tokens = prepare_reference(prepared.reftext)
+
+            if current and prepared.recognizer is None and not prepared.cancelled.is_set():
+                prepared.recognizer = new_recognizer()
+        except Exception as e:
+            print(f"[AnkiPA] Prefetch failed for card {prepared.card_id}: {e}")
+
+    @staticmethod
+    def _tts_wanted() -> bool:
+        from . import app_settings
+        return app_settings.value("prefetch-tts", "False") == "True"
+
+    @staticmethod
+    def _prepare_tts(prepared: PreparedCard) -> None:
+        """Generate TTS for a card; called on the main thread."""
+        if prepared.cancelled.is_set() or prepared.tts_path is not None:
+            return
+
+        try:
+            from .tts import TTS
+            prepared.tts_path = TTS.gen_tts_audio(text=prepared.reftext)
+        except Exception as e:
+            print(f"[AnkiPA] TTS prefetch failed for card {prepared.card_id}: {e}")
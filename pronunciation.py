@@ -1,12 +1,16 @@
 import json
 import wave
 import os
-import tempfile
 import difflib
 import re
+import copy
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
 
 from vosk import Model, KaldiRecognizer
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from rapidfuzz.distance import Levenshtein
 from scipy import signal
 
@@ -15,7 +19,9 @@ import numpy as np
 
 from functools import lru_cache
 
-from .ankipa import AnkiPA
+from .archive import SAMPLE_RATE, has_recording, load_recording, store_recording, store_recording_blocks
+from .cache import LRUCache, hash_audio
+from .deadline import AssessmentStopped, Deadline
 
 
 MODEL_PATH = os.path.join(
@@ -26,6 +32,32 @@ MODEL_PATH = os.path.join(
 
 _VOSK_MODEL = None
 
+# Bump whenever the scoring below changes so cached results are not reused
+SCORING_VERSION = 1
+
+# Recordings longer than this many seconds are assessed in long-form mode
+LONG_FORM_SECONDS = 30.0
+# Reference words the long-form aligner looks ahead beyond each segment
+LONG_FORM_LOOKAHEAD = 20
+
+# Recordings longer than this many seconds are split at pauses and decoded
+# in parallel when parallel decoding is enabled
+PARALLEL_MIN_SECONDS = 20.0
+# Shortest segment worth decoding on its own, and shortest pause to split at
+PARALLEL_MIN_SEGMENT = 5.0
+PARALLEL_MIN_PAUSE = 0.3
+
+# Vosk releases the GIL while decoding, so threads sharing the model run on
+# separate cores without loading a model copy per worker
+_DECODE_POOL = None
+_DECODE_POOL_LOCK = threading.Lock()
+
+# Raw Vosk words keyed by audio hash, scored results by (audio hash, reference, version).
+# Words are cached with the mode that decoded them: a flat word list for
+# "plain", one word list per recognised segment for "long_form"
+_WORDS_CACHE = LRUCache(maxsize=64)
+_RESULT_CACHE = LRUCache(maxsize=256)
+
 _NON_IPA = re.compile(r"[^a-zɪʊɛɔæʌəɑθðʃʒŋ ]+")
 
 def init_pronunciation_engine():
@@ -53,11 +85,7 @@ def _get_phones(word: str):
         return []
 
 
-def _ensure_wav_16k_mono(src_path: str) -> str:
-    with wave.open(src_path, "rb") as w:
-        nchannels, sampwidth, framerate, nframes, _, _ = w.getparams()
-        frames = w.readframes(nframes)
-
+def _to_mono_int16(frames: bytes, nchannels: int, sampwidth: int) -> np.ndarray:
     if sampwidth == 1:
         audio_data = np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128
     elif sampwidth == 2:
@@ -69,21 +97,51 @@ def _ensure_wav_16k_mono(src_path: str) -> str:
         audio_data = audio_data.reshape(-1, nchannels)
         audio_data = np.mean(audio_data, axis=1).astype(np.int16)
 
-    if framerate != 16000:
-        num_samples = int(len(audio_data) * 16000 / framerate)
+    return audio_data
+
+
+def _load_16k_mono(src_path: str) -> np.ndarray:
+    """Read a WAV file as 16 kHz mono int16 samples."""
+    with wave.open(src_path, "rb") as w:
+        nchannels, sampwidth, framerate, nframes, _, _ = w.getparams()
+        frames = w.readframes(nframes)
+
+    audio_data = _to_mono_int16(frames, nchannels, sampwidth)
+
+    if framerate != SAMPLE_RATE:
+        num_samples = int(len(audio_data) * SAMPLE_RATE / framerate)
         audio_data = signal.resample(audio_data, num_samples).astype(np.int16)
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-    tmp_path = tmp.name
-    tmp.close()
+    return audio_data
 
-    with wave.open(tmp_path, "wb") as w:
-        w.setnchannels(1)
-        w.setsampwidth(2)
-        w.setframerate(16000)
-        w.writeframes(audio_data.tobytes())
 
-    return tmp_path
+def _iter_16k_mono(src_path: str, block_seconds: float = 1.0) -> Iterator[np.ndarray]:
+    """Stream a WAV file as blocks of 16 kHz mono int16 samples.
+
+    Unlike _load_16k_mono, only one block is held in memory at a time.
+    """
+    with wave.open(src_path, "rb") as w:
+        nchannels, sampwidth, framerate, _, _, _ = w.getparams()
+        gcd = math.gcd(SAMPLE_RATE, framerate)
+        up, down = SAMPLE_RATE // gcd, framerate // gcd
+        block_frames = max(1, int(framerate * block_seconds))
+
+        while True:
+            frames = w.readframes(block_frames)
+            if not frames:
+                break
+
+            audio_data = _to_mono_int16(frames, nchannels, sampwidth)
+            if framerate != SAMPLE_RATE:
+                audio_data = signal.resample_poly(audio_data, up, down)
+                audio_data = np.clip(audio_data, -32768, 32767).astype(np.int16)
+
+            yield audio_data
+
+
+def _wav_duration(src_path: str) -> float:
+    with wave.open(src_path, "rb") as w:
+        return w.getnframes() / float(w.getframerate())
 
 
 def _tokenise(text: str):
@@ -95,75 +153,680 @@ def _tokenise(text: str):
     ]
 
 
-def pron_assess(reference_text, recorded_voice):
-    try:
-        init_pronunciation_engine()
-    except Exception as e:
-        return {"error": f"Engine init failed: {e}"}
+def new_recognizer() -> KaldiRecognizer:
+    """Create a recognizer ready for 16 kHz input with word timestamps."""
+    init_pronunciation_engine()
+    rec = KaldiRecognizer(_VOSK_MODEL, float(SAMPLE_RATE))
+    rec.SetWords(True)
+    return rec
 
-    wav_path = None
 
-    try:
-        wav_path = _ensure_wav_16k_mono(recorded_voice)
+def live_recognizer(sample_rate: float, words: Optional[list] = None) -> KaldiRecognizer:
+    """Create a cheap recognizer for live audio, optionally limited to ``words``."""
+    init_pronunciation_engine()
+    if words:
+        grammar = sorted({w.lower() for w in words}) + ["[unk]"]
+        return KaldiRecognizer(_VOSK_MODEL, float(sample_rate), json.dumps(grammar))
+    return KaldiRecognizer(_VOSK_MODEL, float(sample_rate))
 
-        rec = KaldiRecognizer(_VOSK_MODEL, 16000.0)
-        rec.SetWords(True)
 
-        recognised = []
+def prepare_reference(reference_text: str) -> list:
+    """Tokenise a reference text and warm the phone cache for its words.
 
-        with wave.open(wav_path, "rb") as wf:
-            while True:
-                data = wf.readframes(4000)
-                if not data:
-                    break
-                if rec.AcceptWaveform(data):
-                    recognised.extend(json.loads(rec.Result()).get("result", []))
-            recognised.extend(json.loads(rec.FinalResult()).get("result", []))
+    Scoring looks phones up through _get_phones, so the lookups done here
+    only save time if its cache still holds them when the card is scored.
+    """
+    tokens = _tokenise(reference_text)
+    for word in set(t.lower() for t in tokens):
+        _get_phones(word)
+    return tokens
 
-    except Exception as e:
-        return {"error": f"Recognition failed: {e}"}
-    finally:
-        if wav_path and os.path.exists(wav_path):
-            os.unlink(wav_path)
 
-    orig_ref_words = _tokenise(reference_text)
-    ref_words = [w.lower() for w in orig_ref_words]
-    rec_words = [r["word"].lower() for r in recognised]
+def _recognise(
+    samples: np.ndarray,
+    rec: Optional[KaldiRecognizer] = None,
+    deadline: Optional[Deadline] = None,
+) -> list:
+    """Decode 16 kHz mono samples and return Vosk's word list (word, start, end, conf).
 
-    display_words = [r["word"] for r in recognised]
-    if display_words:
-        display_words[0] = display_words[0].capitalize()
+    ``rec`` may be an unused recognizer from new_recognizer(); it is consumed.
+    ``deadline`` is checked between chunks; when it expires AssessmentStopped
+    is raised with the words decoded so far.
+    """
+    if rec is None:
+        rec = new_recognizer()
+    deadline = deadline or Deadline()
 
-    recognized_text = " ".join(display_words)
+    recognised = []
 
-    rec_starts = [r.get("start", 0.0) for r in recognised]
-    rec_ends = [r.get("end", 0.0) for r in recognised]
+    for start in range(0, len(samples), 4000):
+        if deadline.reason is not None:
+            recognised.extend(json.loads(rec.FinalResult()).get("result", []))
+            deadline.check(recognised)
 
-    # Pre-cache reference phones
-    ref_phones_map = {w: _get_phones(w) for w in set(ref_words)}
-
-    def calculate_word_score(ref_w, rec_w):
-        ref_ph = ref_phones_map.get(ref_w, [])
-        rec_ph = _get_phones(rec_w)
-        
-        if ref_ph or rec_ph:
-            dist = Levenshtein.distance(ref_ph, rec_ph)
-            max_len = max(len(ref_ph), len(rec_ph))
-            phone_sim = 100 * (1 - dist / max_len) if max_len else 0
+        # Slicing keeps memory-mapped archive reads lazy
+        data = samples[start:start + 4000].tobytes()
+        if rec.AcceptWaveform(data):
+            recognised.extend(json.loads(rec.Result()).get("result", []))
+    recognised.extend(json.loads(rec.FinalResult()).get("result", []))
+
+    return recognised
+
+
+def _recognise_nbest(
+    samples: np.ndarray,
+    nbest: int,
+    rec: Optional[KaldiRecognizer] = None,
+    deadline: Optional[Deadline] = None,
+) -> list:
+    """Decode with ``nbest`` alternatives per utterance.
+
+    Returns one list per utterance, holding each alternative's word list in
+    Vosk's order of confidence. Stops like _recognise, carrying the
+    utterances decoded so far.
+    """
+    if rec is None:
+        rec = new_recognizer()
+    rec.SetMaxAlternatives(nbest)
+    deadline = deadline or Deadline()
+
+    segments = []
+
+    def add(raw):
+        alternatives = [alt.get("result", []) for alt in json.loads(raw).get("alternatives", [])]
+        alternatives = [words for words in alternatives if words]
+        if alternatives:
+            segments.append(alternatives)
+
+    for start in range(0, len(samples), 4000):
+        if deadline.reason is not None:
+            add(rec.FinalResult())
+            deadline.check(segments)
+
+        if rec.AcceptWaveform(samples[start:start + 4000].tobytes()):
+            add(rec.Result())
+    add(rec.FinalResult())
+
+    return segments
+
+
+def _phone_string(word: str) -> str:
+    return "".join(_get_phones(word)) or word
+
+
+def _alignment_score(similarity: np.ndarray, insertion_cost: float = 0.5) -> float:
+    """Best monotonic matching score of a (reference x hypothesis) similarity matrix.
+
+    Skipping a reference word is free, since every alternative is measured
+    against the same reference, while every unmatched hypothesis word costs
+    ``insertion_cost``. Rows are processed as whole vectors.
+    """
+    n_hyp = similarity.shape[1]
+    gaps = insertion_cost * np.arange(n_hyp + 1)
+    prev = -gaps
+    for row in similarity:
+        candidate = np.empty(n_hyp + 1)
+        candidate[0] = 0.0
+        np.maximum(prev[1:], prev[:-1] + row, out=candidate[1:])
+        # Extending along the row means leaving hypothesis words unmatched
+        prev = np.maximum.accumulate(candidate + gaps) - gaps
+    return float(prev[-1])
+
+
+def _select_hypotheses(reference_text: str, segments: list) -> list:
+    """Pick, for every utterance, the alternative that best matches the reference."""
+    ref_phones = [_phone_string(w.lower()) for w in _tokenise(reference_text)]
+
+    recognised = []
+    for alternatives in segments:
+        if len(alternatives) == 1 or not ref_phones:
+            recognised.extend(alternatives[0])
+            continue
+
+        hyp_phones = [_phone_string(w["word"].lower()) for words in alternatives for w in words]
+
+        # One similarity pass for all alternatives, centred so poor matches
+        # count against a hypothesis rather than being ignored
+        similarity = process.cdist(
+            ref_phones, hyp_phones, scorer=Levenshtein.normalized_similarity, dtype=np.float32
+        ) - 0.5
+
+        scores = []
+        offset = 0
+        for words in alternatives:
+            scores.append(_alignment_score(similarity[:, offset:offset + len(words)]))
+            offset += len(words)
+
+        # Ties go to the alternative Vosk was most confident about
+        recognised.extend(alternatives[int(np.argmax(scores))])
+
+    return recognised
+
+
+def _split_at_silences(samples: np.ndarray) -> list:
+    """Return ``(start, end)`` sample ranges that cut the recording in pauses."""
+    frame = int(SAMPLE_RATE * 0.03)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0, len(samples))]
+
+    frames = samples[: n_frames * frame].astype(np.float32).reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    silent = rms < 0.1 * np.percentile(rms, 95)
+
+    # Start and end frame of every silent run
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+
+    min_pause = int(PARALLEL_MIN_PAUSE / 0.03)
+    min_segment = int(PARALLEL_MIN_SEGMENT * SAMPLE_RATE)
+
+    bounds = []
+    start = 0
+    for run_start, run_end in zip(run_starts, run_ends):
+        if run_end - run_start < min_pause:
+            continue
+        cut = (run_start + run_end) // 2 * frame
+        if cut - start >= min_segment and len(samples) - cut >= min_segment:
+            bounds.append((start, cut))
+            start = cut
+    bounds.append((start, len(samples)))
+
+    return bounds
+
+
+def _decode_pool() -> ThreadPoolExecutor:
+    """Return the shared decode pool, creating it on first use."""
+    global _DECODE_POOL
+
+    # Assessments run on several scheduler workers, so guard the creation
+    with _DECODE_POOL_LOCK:
+        if _DECODE_POOL is None:
+            _DECODE_POOL = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                thread_name_prefix="AnkiPA decode",
+            )
+        return _DECODE_POOL
+
+
+def _recognise_parallel(samples: np.ndarray, deadline: Optional[Deadline] = None) -> list:
+    """Decode pause-separated segments concurrently and stitch the words back together.
+
+    All segments share ``deadline``. When it expires, the words of the
+    segments finished in order, plus those of the first unfinished one, are
+    carried by AssessmentStopped.
+    """
+    deadline = deadline or Deadline()
+    bounds = _split_at_silences(samples)
+    if len(bounds) == 1:
+        return _recognise(samples, deadline=deadline)
+
+    pool = _decode_pool()
+    futures = [pool.submit(_recognise, samples[b[0]:b[1]], None, deadline) for b in bounds]
+
+    recognised = []
+    stopped = None
+    for (start, _), future in zip(bounds, futures):
+        try:
+            words = future.result()
+        except AssessmentStopped as e:
+            stopped = e
+            words = e.recognised or []
+
+        offset = start / SAMPLE_RATE
+        for word in words:
+            word = dict(word)
+            word["start"] = word.get("start", 0.0) + offset
+            word["end"] = word.get("end", 0.0) + offset
+            recognised.append(word)
+
+        if stopped is not None:
+            # Segments not yet started give up at their first chunk
+            for future in futures:
+                future.cancel()
+            raise AssessmentStopped(stopped.reason, recognised)
+
+    return recognised
+
+
+def pron_assess(
+    reference_text,
+    recorded_voice,
+    archive=False,
+    recognizer=None,
+    long_form=None,
+    on_partial: Optional[Callable[[dict], None]] = None,
+    parallel=False,
+    nbest=0,
+    deadline: Optional[Deadline] = None,
+):
+    """Assess a recording against the reference text.
+
+    Recordings longer than LONG_FORM_SECONDS (or any recording, when
+    ``long_form`` is True) are decoded in long-form mode: audio is streamed
+    in blocks, each recognised segment is aligned against a moving window of
+    the reference, and ``on_partial`` is called with a score per segment.
+
+    With ``parallel``, recordings longer than PARALLEL_MIN_SECONDS are instead
+    split at pauses and the segments decoded concurrently.
+
+    With ``nbest`` above zero, recordings that use neither mode are decoded
+    with that many alternatives per utterance and the alternative closest to
+    the reference is scored, so a narrowly lost accented word is not counted
+    as an error.
+
+    ``deadline`` is checked while decoding, and before and after each step
+    that cannot be interrupted: hashing and loading the recording, and
+    picking alternatives and scoring. If it is cancelled or expires, the
+    words decoded so far are scored as a partial result with ``Stopped`` set
+    to "cancelled" or "timeout"; nothing is cached or archived for it.
+    """
+    try:
+        init_pronunciation_engine()
+    except Exception as e:
+        return {"error": f"Engine init failed: {e}"}
+
+    deadline = deadline or Deadline()
+    try:
+        deadline.check()
+        audio_id = hash_audio(recorded_voice)
+        deadline.check()
+    except AssessmentStopped as e:
+        return _stopped_result(reference_text, e, None)
+    except OSError as e:
+        return {"error": f"Recognition failed: {e}"}
+
+    samples = None
+    result_key = (audio_id, reference_text, SCORING_VERSION, nbest)
+    result = _RESULT_CACHE.get(result_key)
+
+    mode = None
+    if result is None:
+        try:
+            duration = _wav_duration(recorded_voice)
+        except Exception as e:
+            return {"error": f"Recognition failed: {e}"}
+        mode = _decode_mode(duration, long_form, parallel, nbest)
+    use_nbest = mode == "nbest"
+    long_form = mode == "long_form"
+    split = mode == "split"
+
+    if use_nbest:
+        # Alternatives do not depend on the reference, so they are cached per audio
+        segments = _WORDS_CACHE.get((audio_id, nbest))
+        if segments is None:
+            try:
+                samples = _load_16k_mono(recorded_voice)
+                deadline.check()
+                segments = _recognise_nbest(samples, nbest, recognizer, deadline)
+            except AssessmentStopped as e:
+                e.recognised = _select_hypotheses(reference_text, e.recognised or [])
+                return _stopped_result(reference_text, e, audio_id)
+            except Exception as e:
+                return {"error": f"Recognition failed: {e}"}
+            _WORDS_CACHE.put((audio_id, nbest), segments)
+
+        try:
+            deadline.check(_first_alternatives(segments))
+            selected = _select_hypotheses(reference_text, segments)
+            deadline.check(selected)
+        except AssessmentStopped as e:
+            return _stopped_result(reference_text, e, audio_id)
+        result = _score(reference_text, selected)
+        result["AudioId"] = audio_id
+        _RESULT_CACHE.put(result_key, result)
+
+    elif result is None:
+        cached = _WORDS_CACHE.get(audio_id)
+        if cached is None:
+            try:
+                if long_form:
+                    result, segments = _assess_long_form(
+                        reference_text, _iter_16k_mono(recorded_voice), recognizer, on_partial, deadline
+                    )
+                    cached = ("long_form", segments)
+                elif split:
+                    samples = _load_16k_mono(recorded_voice)
+                    deadline.check()
+                    cached = ("plain", _recognise_parallel(samples, deadline))
+                else:
+                    samples = _load_16k_mono(recorded_voice)
+                    deadline.check()
+                    cached = ("plain", _recognise(samples, recognizer, deadline))
+            except AssessmentStopped as e:
+                return _stopped_result(reference_text, e, audio_id)
+            except Exception as e:
+                return {"error": f"Recognition failed: {e}"}
+            _WORDS_CACHE.put(audio_id, cached)
+
+        if result is None:
+            try:
+                mode, words = cached
+                deadline.check(_flatten(words) if mode == "long_form" else words)
+            except AssessmentStopped as e:
+                return _stopped_result(reference_text, e, audio_id)
+            result = _score_cached(reference_text, *cached)
+        result["AudioId"] = audio_id
+        _RESULT_CACHE.put(result_key, result)
+
+    if archive and not has_recording(audio_id):
+        try:
+            if samples is not None:
+                store_recording(audio_id, samples)
+            else:
+                # Stream into the archive rather than loading long recordings whole
+                store_recording_blocks(audio_id, _iter_16k_mono(recorded_voice))
+        except Exception as e:
+            print(f"[AnkiPA] Failed to archive recording: {e}")
+
+    # Callers may mutate the result, so never hand out the cached object
+    return copy.deepcopy(result)
+
+
+def _stopped_result(reference_text: str, stopped: AssessmentStopped, audio_id: Optional[str]) -> dict:
+    """Score the words decoded before an assessment was stopped.
+
+    Reference words after the last one read are left out rather than counted
+    as omissions.
+    """
+    if not stopped.recognised:
+        message = "Assessment cancelled" if stopped.reason == "cancelled" else "Assessment timed out"
+        return {"error": f"{message} before any words were recognised", "Stopped": stopped.reason}
+
+    aligner = _LongFormAligner(reference_text)
+    aligner.feed(stopped.recognised)
+    aligner.settle()
+    result = aligner.partial()
+    result["RecognitionStatus"] = stopped.reason.capitalize()
+    result["Stopped"] = stopped.reason
+    result["AudioId"] = audio_id
+    return result
+
+
+def _flatten(segments: list) -> list:
+    return [word for segment in segments for word in segment]
+
+
+def _first_alternatives(segments: list) -> list:
+    """The words Vosk was most confident about, from N-best segments."""
+    return [word for alternatives in segments if alternatives for word in alternatives[0]]
+
+
+def _score_cached(reference_text: str, mode: str, words: list) -> dict:
+    """Score cached words the same way as the mode that decoded them."""
+    if mode == "long_form":
+        aligner = _LongFormAligner(reference_text)
+        for segment in words:
+            aligner.feed(segment)
+        return aligner.finish()
+    return _score(reference_text, words)
+
+
+def _decode_mode(duration: float, long_form=None, parallel=False, nbest=0) -> str:
+    """Pick how a recording of ``duration`` seconds is decoded.
+
+    Returns "long_form", "split" (decoded in parallel), "nbest" or "plain".
+    """
+    if long_form is None:
+        long_form = not parallel and duration > LONG_FORM_SECONDS
+    if long_form:
+        return "long_form"
+    if parallel and duration > PARALLEL_MIN_SECONDS:
+        return "split"
+    # Alternatives only replace the plain single-pass decoder
+    return "nbest" if nbest > 0 else "plain"
+
+
+def _blocks(samples: np.ndarray, block_seconds: float = 1.0) -> Iterator[np.ndarray]:
+    """Split 16 kHz samples, e.g. a memory-mapped recording, into blocks."""
+    size = int(SAMPLE_RATE * block_seconds)
+    for start in range(0, len(samples), size):
+        yield samples[start:start + size]
+
+
+def _assess_long_form(reference_text, blocks, recognizer=None, on_partial=None, deadline=None):
+    """Decode 16 kHz blocks one by one, scoring each recognised segment as it ends.
+
+    Returns the final result and the recognised words, one list per segment.
+    """
+    rec = recognizer if recognizer is not None else new_recognizer()
+    deadline = deadline or Deadline()
+    aligner = _LongFormAligner(reference_text)
+    recognised = []
+    segments = []
+
+    def feed(words):
+        if words:
+            segments.append(words)
+        recognised.extend(words)
+        partial = aligner.feed(words)
+        if partial is not None and on_partial is not None:
+            on_partial(partial)
+
+    for block in blocks:
+        if deadline.reason is not None:
+            recognised.extend(json.loads(rec.FinalResult()).get("result", []))
+            deadline.check(recognised)
+
+        if rec.AcceptWaveform(block.tobytes()):
+            feed(json.loads(rec.Result()).get("result", []))
+    feed(json.loads(rec.FinalResult()).get("result", []))
+
+    return aligner.finish(), segments
+
+
+class _LongFormAligner:
+    """Aligns recognised segments against a moving window of the reference.
+
+    Each segment is matched against the next unmatched reference words plus
+    LONG_FORM_LOOKAHEAD more, so alignment cost does not grow with the length
+    of the passage. Reference words at the end of the window that were not
+    matched stay pending for the next segment, and so do recognised words
+    after the last match: a trailing filler must not use up the next
+    reference word, which the following segment may still read.
+    """
+
+    def __init__(self, reference_text: str):
+        self.orig_ref_words = _tokenise(reference_text)
+        self.ref_words = [w.lower() for w in self.orig_ref_words]
+        self.cursor = 0
+        self.segments = 0
+        self.words_out = []
+        self.transcript = []
+        self.score_sum = 0
+        self.n_rec = 0
+        self.first_start = None
+        self.last_end = 0.0
+        # Recognised words after the last match, carried into the next segment
+        self.held = []
+
+    def feed(self, recognised: list) -> Optional[dict]:
+        """Score one recognised segment and return its partial result."""
+        if not recognised:
+            return None
+
+        recognised = self.held + list(recognised)
+        self.held = []
+        rec_words = [r["word"].lower() for r in recognised]
+
+        end = min(len(self.ref_words), self.cursor + len(rec_words) + LONG_FORM_LOOKAHEAD)
+        ref_words = self.ref_words[self.cursor:end]
+
+        opcodes = difflib.SequenceMatcher(a=ref_words, b=rec_words, autojunk=False).get_opcodes()
+
+        last_equal = max((k for k, op in enumerate(opcodes) if op[0] == "equal"), default=-1)
+        if last_equal >= 0:
+            # Hold back what follows the last match, rather than consuming
+            # reference words for it
+            kept = opcodes[:last_equal + 1]
+            self.held = recognised[kept[-1][4]:]
+            recognised = recognised[:kept[-1][4]]
+        else:
+            # Nothing matched: consume as many reference words as were
+            # recognised, so a misread segment still moves the window on
+            kept = []
+            for tag, i1, i2, j1, j2 in opcodes:
+                if tag == "delete":
+                    continue
+                if tag == "replace":
+                    i2 = i1 + min(i2 - i1, j2 - j1)
+                kept.append((tag, i1, i2, j1, j2))
+
+        words = self._consume(recognised, kept)
+        self.segments += 1
+
+        scores = [w["AccuracyScore"] for w in words]
+        return {
+            "Segment": self.segments,
+            "Transcript": " ".join(w["word"] for w in recognised),
+            "AccuracyScore": round(sum(scores) / len(scores), 2) if scores else 0.0,
+            "Words": words,
+            "Progress": self.cursor / len(self.ref_words) if self.ref_words else 1.0,
+        }
+
+    def _consume(self, recognised: list, opcodes: list) -> list:
+        """Score recognised words with opcodes relative to the cursor and advance it."""
+        rec_words = [r["word"].lower() for r in recognised]
+        display_words = [r["word"] for r in recognised]
+        if self.n_rec == 0 and display_words:
+            display_words[0] = display_words[0].capitalize()
+
+        ref_end = max((op[2] for op in opcodes), default=0)
+        words = _align(
+            opcodes,
+            self.orig_ref_words[self.cursor:self.cursor + ref_end],
+            self.ref_words[self.cursor:self.cursor + ref_end],
+            rec_words,
+            display_words,
+        )
+
+        self.cursor += max((op[2] for op in opcodes if op[0] in ("equal", "replace", "delete")), default=0)
+        self.words_out.extend(words)
+        self.transcript.extend(display_words)
+        self.score_sum += sum(w["AccuracyScore"] for w in words)
+        self.n_rec += len(rec_words)
+        if recognised:
+            if self.first_start is None:
+                self.first_start = recognised[0].get("start", 0.0)
+            self.last_end = max(self.last_end, recognised[-1].get("end", 0.0))
+        return words
+
+    def settle(self) -> None:
+        """Score held-back words as insertions, leaving the reference after them unread."""
+        if self.held:
+            held, self.held = self.held, []
+            self._consume(held, [("insert", 0, 0, 0, len(held))])
+
+    def finish(self) -> dict:
+        """Align held-back words with the rest of the reference and return the full result.
+
+        Reference words that were never read are marked as omitted.
+        """
+        if self.held:
+            held, self.held = self.held, []
+            rec_words = [r["word"].lower() for r in held]
+            opcodes = difflib.SequenceMatcher(
+                a=self.ref_words[self.cursor:], b=rec_words, autojunk=False
+            ).get_opcodes()
+            self._consume(held, opcodes)
+
+        for word in self.orig_ref_words[self.cursor:]:
+            self.words_out.append({
+                "Word": word,
+                "ErrorType": "Omission",
+                "AccuracyScore": 0,
+            })
+        self.cursor = len(self.ref_words)
+
+        return self.partial()
+
+    def partial(self) -> dict:
+        """Return the result for the segments fed so far."""
+        n_words = len(self.words_out)
+        accuracy = round(self.score_sum / n_words, 2) if n_words else 0.0
+
+        if self.first_start is not None:
+            fluency = _fluency(self.n_rec, self.first_start, self.last_end)
         else:
-            phone_sim = 0
+            fluency = 0.0
+
+        return _result(" ".join(self.transcript), accuracy, fluency, self.words_out)
+
+
+def rescore_history(entries, parallel=False, nbest=0, deadline: Optional[Deadline] = None):
+    """Re-score history entries whose recordings are in the archive.
+
+    Yields ``(entry, result)`` pairs; entries without an archived recording
+    are skipped. Each recording is decoded the way pron_assess would decode
+    it with the same ``parallel`` and ``nbest`` settings. Recordings are read
+    memory-mapped and decoded only when the word cache does not already hold
+    them. Once ``deadline`` is cancelled or expires, no more pairs are yielded.
+    """
+    init_pronunciation_engine()
+    deadline = deadline or Deadline()
+
+    for entry in entries:
+        audio_id = entry.get("audio_id")
+        if not audio_id or not has_recording(audio_id):
+            continue
+
+        reference_text = entry.get("target_text", "")
+        samples = load_recording(audio_id)
+        mode = _decode_mode(len(samples) / SAMPLE_RATE, None, parallel, nbest)
+        try:
+            deadline.check()
+            if mode == "nbest":
+                segments = _WORDS_CACHE.get((audio_id, nbest))
+                if segments is None:
+                    segments = _recognise_nbest(samples, nbest, None, deadline)
+                    _WORDS_CACHE.put((audio_id, nbest), segments)
+                deadline.check()
+                result = _score(reference_text, _select_hypotheses(reference_text, segments))
+            else:
+                cached = _WORDS_CACHE.get(audio_id)
+                if cached is None:
+                    if mode == "long_form":
+                        _, segments = _assess_long_form(reference_text, _blocks(samples), deadline=deadline)
+                        cached = ("long_form", segments)
+                    elif mode == "split":
+                        cached = ("plain", _recognise_parallel(samples, deadline))
+                    else:
+                        cached = ("plain", _recognise(samples, deadline=deadline))
+                    _WORDS_CACHE.put(audio_id, cached)
+                deadline.check()
+                result = _score_cached(reference_text, *cached)
+        except AssessmentStopped:
+            return
+
+        result["AudioId"] = audio_id
+        yield entry, result
+
+
+def _word_score(ref_w: str, rec_w: str) -> int:
+    ref_ph = _get_phones(ref_w)
+    rec_ph = _get_phones(rec_w)
+
+    if ref_ph or rec_ph:
+        dist = Levenshtein.distance(ref_ph, rec_ph)
+        max_len = max(len(ref_ph), len(rec_ph))
+        phone_sim = 100 * (1 - dist / max_len) if max_len else 0
+    else:
+        phone_sim = 0
 
-        orth_sim = fuzz.ratio(ref_w, rec_w)
-        return int(round(0.7 * phone_sim + 0.3 * orth_sim))
+    orth_sim = fuzz.ratio(ref_w, rec_w)
+    return int(round(0.7 * phone_sim + 0.3 * orth_sim))
 
-    sm = difflib.SequenceMatcher(a=ref_words, b=rec_words)
+
+def _align(opcodes, orig_ref_words, ref_words, rec_words, display_words) -> list:
+    """Turn SequenceMatcher opcodes into scored word entries."""
     words_out = []
 
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+    for tag, i1, i2, j1, j2 in opcodes:
 
         if tag == "equal":
             for ri, rj in zip(range(i1, i2), range(j1, j2)):
-                score = calculate_word_score(ref_words[ri], rec_words[rj])
+                score = _word_score(ref_words[ri], rec_words[rj])
                 words_out.append({
                     "Word": display_words[rj],
                     "ErrorType": "None" if score >= 60 else "Mispronunciation",
@@ -175,7 +838,7 @@ def pron_assess(reference_text, recorded_voice):
             n_rec = j2 - j1
             for k in range(max(n_ref, n_rec)):
                 if k < n_ref and k < n_rec:
-                    score = calculate_word_score(ref_words[i1+k], rec_words[j1+k])
+                    score = _word_score(ref_words[i1+k], rec_words[j1+k])
                     words_out.append({
                         "Word": display_words[j1+k],
                         "ErrorType": "Mispronunciation",
@@ -210,22 +873,22 @@ def pron_assess(reference_text, recorded_voice):
                     "AccuracyScore": 0,
                 })
 
-    scores = [w["AccuracyScore"] for w in words_out]
-    accuracy = round(sum(scores) / len(scores), 2) if scores else 0.0
+    return words_out
+
+
+def _fluency(n_words: int, first_start: float, last_end: float) -> float:
+    duration = last_end - first_start
+    wps = n_words / duration if duration > 0 else 0
+    return round(max(0.0, min(100.0, (wps - 0.5) / 4.5 * 100.0)), 2)
 
-    if rec_starts and rec_ends:
-        duration = max(rec_ends) - min(rec_starts)
-        wps = len(rec_words) / duration if duration > 0 else 0
-        fluency = round(max(0.0, min(100.0, (wps - 0.5) / 4.5 * 100.0)), 2)
-    else:
-        fluency = 0.0
 
+def _result(transcript: str, accuracy: float, fluency: float, words_out: list) -> dict:
     pron_score = round(0.8 * accuracy + 0.2 * fluency, 2)
     pron_score = max(pron_score, 20)
 
-    result = {
+    return {
         "RecognitionStatus": "Success",
-        "Transcript": recognized_text,
+        "Transcript": transcript,
         "NBest": [{
             "AccuracyScore": accuracy,
             "FluencyScore": fluency,
@@ -234,5 +897,31 @@ def pron_assess(reference_text, recorded_voice):
         }],
     }
 
-    AnkiPA.RESULT = result
-    return result
\ No newline at end of file
+
+def _score(reference_text: str, recognised: list) -> dict:
+    """Align recognised words against the reference and compute the scores."""
+    orig_ref_words = _tokenise(reference_text)
+    ref_words = [w.lower() for w in orig_ref_words]
+    rec_words = [r["word"].lower() for r in recognised]
+
+    display_words = [r["word"] for r in recognised]
+    if display_words:
+        display_words[0] = display_words[0].capitalize()
+
+    recognized_text = " ".join(display_words)
+
+    rec_starts = [r.get("start", 0.0) for r in recognised]
+    rec_ends = [r.get("end", 0.0) for r in recognised]
+
+    sm = difflib.SequenceMatcher(a=ref_words, b=rec_words)
+    words_out = _align(sm.get_opcodes(), orig_ref_words, ref_words, rec_words, display_words)
+
+    scores = [w["AccuracyScore"] for w in words_out]
+    accuracy = round(sum(scores) / len(scores), 2) if scores else 0.0
+
+    if rec_starts and rec_ends:
+        fluency = _fluency(len(rec_words), min(rec_starts), max(rec_ends))
+    else:
+        fluency = 0.0
+
+    return _result(recognized_text, accuracy, fluency, words_out)
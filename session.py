@@ -0,0 +1,168 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from aqt import mw
+
+from .deadline import Deadline
+
+
+class AssessmentSession:
+    """State of a single assessment, from recording to displayed result.
+
+    Card metadata is captured when recording starts, so it stays correct
+    after the reviewer has moved on to the next card.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        reftext: str,
+        field_name: str = "",
+        note_id: int = -1,
+        card_id: int = -1,
+        deck_name: str = "",
+        reps: int = 0,
+        interval: int = 0,
+    ):
+        self.id = next(self._ids)
+        self.reftext = reftext
+        self.field_name = field_name
+        self.note_id = note_id
+        self.card_id = card_id
+        self.deck_name = deck_name
+        self.reps = reps
+        self.interval = interval
+
+        self.archive = False
+        self.parallel = False
+        self.nbest = 0
+        # PreparedCard from the prefetcher, if the card was prepared in time
+        self.prepared = None
+        self.recorded: Optional[str] = None
+        self.tts_gen: Optional[str] = None
+        self.result: Optional[dict] = None
+        self.html: Optional[str] = None
+        self.pronunciation: float = 0.0
+        self.error: Optional[str] = None
+        # Latest per-segment result while a long-form assessment is scored
+        self.partial: Optional[dict] = None
+        # Cancels scoring or limits its duration; replaced before submitting
+        self.deadline = Deadline()
+
+        # recording -> scoring -> done | failed | cancelled
+        self.status = "recording"
+
+    def keep_recording(self, recorded_voice: str) -> str:
+        """Copy the recording to a file owned by this session and return its path.
+
+        Anki records every take to the same temp file, so the next recording
+        would otherwise overwrite this one while it is still being scored.
+        """
+        tmpdir = os.path.join(tempfile.gettempdir(), "ankipa")
+        os.makedirs(tmpdir, exist_ok=True)
+        path = os.path.join(tmpdir, f"recording-{self.id}.wav")
+        shutil.copyfile(recorded_voice, path)
+        self.recorded = path
+        return path
+
+    def discard(self):
+        """Remove files owned by this session."""
+        if self.recorded and os.path.exists(self.recorded):
+            try:
+                os.remove(self.recorded)
+            except OSError:
+                pass
+        self.recorded = None
+
+
+class AssessmentScheduler:
+    """Scores sessions on a small worker pool while the user keeps reviewing.
+
+    Listeners are called on the main thread whenever a session is queued or
+    finishes. Finished sessions are kept for display up to ``keep``; older
+    ones are discarded. Each session's deadline starts when a worker picks
+    it up.
+    """
+
+    def __init__(self, max_workers: int = 2, keep: int = 50):
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="AnkiPA assessment")
+        self._sessions: List[AssessmentSession] = []
+        self._futures: Dict[int, Future] = {}
+        self._listeners: List[Callable[[AssessmentSession], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[AssessmentSession], None]):
+        self._listeners.append(listener)
+
+    def submit(self, session: AssessmentSession, work: Callable[[AssessmentSession], None]):
+        session.status = "scoring"
+
+        with self._lock:
+            self._sessions.append(session)
+            finished = [s for s in self._sessions if s.status in ("done", "failed", "cancelled")]
+            for old in finished[: max(0, len(finished) - self.keep)]:
+                self._sessions.remove(old)
+                old.discard()
+
+        self._notify(session)
+
+        def run(session):
+            session.deadline.start()
+            work(session)
+
+        future = self._executor.submit(run, session)
+        with self._lock:
+            self._futures[session.id] = future
+        future.add_done_callback(lambda f: self._on_done(session, f))
+
+    def cancel(self, session: AssessmentSession):
+        """Stop scoring a session; decoding gives up at its next chunk."""
+        session.deadline.cancel()
+        with self._lock:
+            future = self._futures.get(session.id)
+        if future is not None:
+            # Sessions still waiting for a worker never start
+            future.cancel()
+
+    def report(self, session: AssessmentSession, partial: dict):
+        """Record a partial result from a worker thread and notify listeners."""
+        session.partial = partial
+        mw.taskman.run_on_main(lambda: self._notify(session))
+
+    def _on_done(self, session: AssessmentSession, future):
+        with self._lock:
+            self._futures.pop(session.id, None)
+
+        error = None if future.cancelled() else future.exception()
+        if future.cancelled():
+            session.status = "cancelled"
+        elif error is not None:
+            print(f"[AnkiPA] Assessment failed: {error}")
+            session.status = "failed"
+            session.error = str(error)
+        elif session.status == "scoring":
+            session.status = "done"
+
+        mw.taskman.run_on_main(lambda: self._notify(session))
+
+    def _notify(self, session: AssessmentSession):
+        for listener in self._listeners:
+            try:
+                listener(session)
+            except Exception as e:
+                print(f"[AnkiPA] Session listener failed: {e}")
+
+    def sessions(self) -> List[AssessmentSession]:
+        with self._lock:
+            return list(self._sessions)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for s in self._sessions if s.status == "scoring")
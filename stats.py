@@ -1,10 +1,32 @@
 import json
 import time
 import os
+import threading
 
 _stats = dict()
 _addonpath = os.path.dirname(os.path.abspath(__file__))
 
+# Guards _stats; mutations may come from the GUI and from assessment threads
+_lock = threading.RLock()
+# Serialises writes of the stats file
+_write_lock = threading.Lock()
+
+# Seconds without further changes before pending stats are written out
+FLUSH_DELAY = 2.0
+
+_dirty = False
+_last_change = 0.0
+_wakeup = threading.Event()
+_writer = None
+
+# Called with each entry after record_assessment
+_listeners = []
+
+# History entries by card and by note ID, oldest first. Built on first use
+# and kept up to date by _append_history; None until then.
+_card_index = None
+_note_index = None
+
 
 def _load_stats():
     global _stats, _addonpath
@@ -16,13 +38,15 @@ def _load_stats():
             data = json.load(fp)
             _stats.clear()
             _stats.update(data)
+            _drop_index()
     except (FileNotFoundError, json.JSONDecodeError):
         print("No existing stats found or file is corrupted; starting with empty stats.")
 
 def get_stat(key: str) -> float:
     date = time.strftime("%d/%m/%Y")
-    _ensure_date_entry(date)
-    return _stats[date][key]
+    with _lock:
+        _ensure_date_entry(date)
+        return _stats[date][key]
 
 def _ensure_date_entry(date: str):
     """Ensure the stats dict has a usable entry for the given date."""
@@ -44,26 +68,176 @@ def _ensure_date_entry(date: str):
 def update_stat(key: str, increment: float, set_value=False):
 
     date = time.strftime("%d/%m/%Y")
-    _ensure_date_entry(date)
+    with _lock:
+        _ensure_date_entry(date)
 
-    if not set_value:
-        _stats[date][key] += increment
-    else:
-        _stats[date][key] = increment
+        if not set_value:
+            _stats[date][key] += increment
+        else:
+            _stats[date][key] = increment
 
 
 def log_assessment(entry: dict):
     """Log a single assessment entry into today's history list.
     """
     date = time.strftime("%d/%m/%Y")
-    _ensure_date_entry(date)
+    with _lock:
+        _ensure_date_entry(date)
+        _append_history(_stats[date], entry)
 
+
+def _append_history(day: dict, entry: dict):
     # using length cap
-    history = _stats[date]["history"]
+    history = day["history"]
     history.append(entry)
+    if _card_index is not None:
+        _index_entry(entry)
     if len(history) > 2000:
         # keep only most recent 2000 entries
-        _stats[date]["history"] = history[-2000:]
+        dropped = history[:-2000]
+        day["history"] = history[-2000:]
+        if _card_index is not None:
+            for old in dropped:
+                _unindex_entry(old)
+
+
+def _drop_index():
+    global _card_index, _note_index
+    _card_index = None
+    _note_index = None
+
+
+def _index_entry(entry: dict):
+    for index, key in ((_card_index, "card_id"), (_note_index, "note_id")):
+        item_id = entry.get(key)
+        if item_id is not None and item_id != -1:
+            index.setdefault(item_id, []).append(entry)
+
+
+def _unindex_entry(entry: dict):
+    for index, key in ((_card_index, "card_id"), (_note_index, "note_id")):
+        attempts = index.get(entry.get(key))
+        if not attempts:
+            continue
+        # Entries may compare equal, so remove this one by identity
+        for i, indexed in enumerate(attempts):
+            if indexed is entry:
+                del attempts[i]
+                break
+        if not attempts:
+            del index[entry.get(key)]
+
+
+def _build_index():
+    global _card_index, _note_index
+
+    days = []
+    for date in _stats:
+        try:
+            days.append((time.strptime(date, "%d/%m/%Y"), date))
+        except ValueError:
+            continue
+    days.sort()
+
+    _card_index = {}
+    _note_index = {}
+    for _, date in days:
+        for entry in _stats[date].get("history", []):
+            _index_entry(entry)
+
+
+def previous_attempts(card_id: int = -1, note_id: int = -1, limit: int = 5) -> list:
+    """Return the last ``limit`` history entries of a card, oldest first.
+
+    Falls back to the note's attempts if the card has none, since all cards of
+    a note are read from the same field. The index is built on first call.
+    """
+    with _lock:
+        if _card_index is None:
+            _build_index()
+
+        attempts = _card_index.get(card_id) or _note_index.get(note_id) or []
+        return attempts[-limit:] if limit > 0 else []
+
+
+def record_assessment(entry: dict):
+    """Apply one assessment to today's totals and history in a single update.
+
+    Equivalent to the update_stat/update_avg_stat/log_assessment sequence, but
+    resolves the date and takes the lock only once.
+    """
+    date = time.strftime("%d/%m/%Y")
+    with _lock:
+        _ensure_date_entry(date)
+        day = _stats[date]
+
+        day["assessments"] += 1
+        assessments = day["assessments"]
+        for key, score in (
+            ("avg_accuracy", entry["accuracy"]),
+            ("avg_fluency", entry["fluency"]),
+            ("avg_pronunciation", entry["pronunciation_score"]),
+        ):
+            day[key] = round((day[key] * (assessments - 1) + score) / assessments, 2)
+
+        day["pronunciation_time"] += entry["audio_length"]
+        day["words"] += entry["words_count"]
+
+        _append_history(day, entry)
+
+    for listener in list(_listeners):
+        try:
+            listener(entry)
+        except Exception as e:
+            print(f"Stats listener failed: {e}")
+
+
+def add_listener(listener):
+    """Call ``listener(entry)`` whenever an assessment is recorded.
+
+    Listeners run on the thread that recorded the assessment, which is
+    usually not the main thread.
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _day_summary(date: str) -> dict:
+    day = _stats[date]
+    return {
+        "day": date,
+        "pronunciation": day["avg_pronunciation"],
+        "accuracy": day["avg_accuracy"],
+        "fluency": day["avg_fluency"],
+        "pron_time": day["pronunciation_time"],
+        "words": day["words"],
+        "assessments": day["assessments"],
+    }
+
+
+def daily_summaries(limit: int = 31) -> list:
+    """Return per-day totals for the most recent ``limit`` days, oldest first."""
+    with _lock:
+        days = []
+        for date in _stats:
+            try:
+                days.append((time.strptime(date, "%d/%m/%Y"), date))
+            except ValueError:
+                continue
+        days.sort()
+        return [_day_summary(date) for _, date in days[-limit:]]
+
+
+def today_summary() -> dict:
+    """Return today's totals in the same shape as daily_summaries."""
+    date = time.strftime("%d/%m/%Y")
+    with _lock:
+        _ensure_date_entry(date)
+        return _day_summary(date)
 
 
 def update_avg_stat(key: str, new_score: float, assessments: float):
@@ -77,25 +251,75 @@ def update_avg_stat(key: str, new_score: float, assessments: float):
 
 
 def save_stats():
+    """Schedule a write of the stats file.
+
+    Writes happen on a background thread once no changes have been made for
+    FLUSH_DELAY seconds, so bursts of assessments cost a single rewrite. Call
+    flush_stats() to write pending changes immediately.
+    """
+    global _dirty, _last_change, _writer
+
+    with _lock:
+        _dirty = True
+        _last_change = time.monotonic()
+
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="AnkiPA stats writer", daemon=True)
+            _writer.start()
+
+    _wakeup.set()
+
+
+def _writer_loop():
+    while True:
+        _wakeup.wait()
+        _wakeup.clear()
+
+        # Debounce: wait until the stats have been quiet for FLUSH_DELAY
+        while True:
+            with _lock:
+                remaining = _last_change + FLUSH_DELAY - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(remaining)
+
+        flush_stats()
+
+
+def flush_stats():
+    """Write pending stats changes to disk now, if there are any."""
+    global _dirty
+
     if not _addonpath:
         print("Addon path not set; cannot save stats.")
         return
-    
-    final_path = os.path.join(_addonpath, "stats.json")
-    tmp_path = final_path + ".tmp"
-    
-    try:
-        with open(tmp_path, "w", encoding="utf-8") as fp:
-            json.dump(_stats, fp, indent=4)
-            
-        os.replace(tmp_path, final_path)
-    except Exception as e:
-        print(f"Failed to save stats: {e}")
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
+
+    with _write_lock:
+        with _lock:
+            if not _dirty:
+                return
+            data = json.dumps(_stats, indent=4)
+            _dirty = False
+
+        final_path = os.path.join(_addonpath, "stats.json")
+        tmp_path = final_path + ".tmp"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fp:
+                fp.write(data)
+                fp.flush()
+                os.fsync(fp.fileno())
+
+            os.replace(tmp_path, final_path)
+        except Exception as e:
+            print(f"Failed to save stats: {e}")
+            with _lock:
+                _dirty = True
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
 
 def get_stats() -> dict:
     """Return the stats dictionary."""
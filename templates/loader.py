@@ -1,8 +1,15 @@
+import html
+import re
 from functools import lru_cache
 from pathlib import Path
+from typing import Iterable, Mapping
 
 
-TEMPLATES_DIR = Path(__file__).resolve().parent  
+TEMPLATES_DIR = Path(__file__).resolve().parent
+
+# Placeholders look like [WORD] or [ERROR-INFO]
+_PLACEHOLDER_RE = re.compile(r"\[([A-Z][A-Z0-9_-]*)\]")
+
 
 @lru_cache()
 def load_template(name: str) -> str:
@@ -11,4 +18,88 @@ def load_template(name: str) -> str:
         return path.read_text(encoding="utf-8")
     except FileNotFoundError:
         print(f"Template not found: {path}")
-        return ""
\ No newline at end of file
+        return ""
+
+
+class Raw(str):
+    """A string of HTML that render() inserts without escaping."""
+
+
+_NEEDS_ESCAPE = re.compile(r"[&<>\"']").search
+
+
+def _escape(value: object) -> str:
+    if isinstance(value, Raw):
+        return value
+    text = str(value)
+    # Most values are plain words or numbers; skip the escaping scan for them
+    if text.isalnum() or _NEEDS_ESCAPE(text) is None:
+        return text
+    return html.escape(text)
+
+
+def _escape_column(values: list) -> list:
+    """Escape a list of values at once; plain strings are escaped in one pass."""
+    types = set(map(type, values))
+    if types == {Raw}:
+        return values
+    if types == {str}:
+        joined = "\x00".join(values)
+        if _NEEDS_ESCAPE(joined) is None:
+            return values
+        if joined.count("\x00") == len(values) - 1:
+            return html.escape(joined).split("\x00")
+    return [_escape(value) for value in values]
+
+
+class Template:
+    """A template parsed once into literal text and placeholder slots.
+
+    render() fills every placeholder in a single pass. Values are HTML-escaped
+    unless they are Raw, which is also what render() returns, so rendered
+    fragments can be nested. Placeholders without a value are left as they are.
+    """
+
+    def __init__(self, source: str):
+        # Literals at even positions, placeholder names at odd positions
+        self._parts = _PLACEHOLDER_RE.split(source)
+        self.names = list(dict.fromkeys(self._parts[1::2]))
+        self._missing = [(name, Raw(f"[{name}]")) for name in self.names]
+        # Slot positions of each name, in the order of self.names
+        self._slots = [
+            [i for i in range(1, len(self._parts), 2) if self._parts[i] == name]
+            for name in self.names
+        ]
+
+    def render(self, values: Mapping[str, object]) -> Raw:
+        out = list(self._parts)
+        for (name, missing), slots in zip(self._missing, self._slots):
+            value = _escape(values.get(name, missing))
+            for slot in slots:
+                out[slot] = value
+        return Raw("".join(out))
+
+    def render_many(self, rows: Iterable[Mapping[str, object]]) -> Raw:
+        """Render the template once per row and concatenate the results.
+
+        Values are escaped a column at a time and every slot is filled with a
+        slice assignment, so the cost per row stays close to plain string
+        concatenation.
+        """
+        rows = list(rows)
+        if not rows:
+            return Raw("")
+
+        stride = len(self._parts)
+        out = self._parts * len(rows)
+        for (name, missing), slots in zip(self._missing, self._slots):
+            column = _escape_column([row.get(name, missing) for row in rows])
+            for slot in slots:
+                out[slot::stride] = column
+
+        return Raw("".join(out))
+
+
+@lru_cache()
+def compile_template(name: str) -> Template:
+    return Template(load_template(name))
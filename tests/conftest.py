@@ -0,0 +1,16 @@
+"""Import add-on modules outside Anki, as benchmarks/_addon.py does.
+
+The add-on's __init__ needs a running Anki, so the package is registered
+without executing it and tests import its submodules directly.
+"""
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "ankipa_local"
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [ADDON_DIR]
+    sys.modules[PACKAGE] = package
@@ -0,0 +1,57 @@
+import pytest
+
+pronunciation = pytest.importorskip("ankipa_local.pronunciation")
+
+REFERENCE = "the quick brown fox jumps over the lazy dog"
+
+
+def _segment(text, start=0.0):
+    return [
+        {"word": word, "start": start + i * 0.4, "end": start + i * 0.4 + 0.3}
+        for i, word in enumerate(text.split())
+    ]
+
+
+def _errors(result):
+    return [(w["Word"], w["ErrorType"]) for w in result["NBest"][0]["Words"] if w["ErrorType"] != "None"]
+
+
+def _long_form(*segments):
+    aligner = pronunciation._LongFormAligner(REFERENCE)
+    for i, text in enumerate(segments):
+        aligner.feed(_segment(text, start=3.0 * i))
+    return aligner.finish()
+
+
+def test_trailing_filler_does_not_use_up_the_next_word():
+    result = _long_form("the quick brown fox um", "jumps over the lazy dog")
+    assert _errors(result) == [("um", "Insertion")]
+
+
+def test_long_form_matches_whole_passage_scoring():
+    result = _long_form("the quick brown fox um", "jumps over the lazy dog")
+    whole = pronunciation._score(REFERENCE, _segment("the quick brown fox um jumps over the lazy dog"))
+    assert _errors(result) == _errors(whole)
+    assert result["NBest"][0]["AccuracyScore"] == whole["NBest"][0]["AccuracyScore"]
+
+
+def test_trailing_filler_at_the_end_is_an_insertion():
+    result = _long_form("the quick brown fox", "jumps over the lazy dog um")
+    assert _errors(result) == [("um", "Insertion")]
+
+
+def test_unmatched_segment_still_moves_the_window():
+    result = _long_form("da kwik", "brown fox jumps", "over the lazy dog")
+    assert _errors(result) == [("Da", "Mispronunciation"), ("kwik", "Mispronunciation")]
+
+
+def test_skipped_words_are_omitted():
+    result = _long_form("the quick", "over the lazy dog")
+    assert _errors(result) == [("brown", "Omission"), ("fox", "Omission"), ("jumps", "Omission")]
+
+
+def test_stopped_result_leaves_unread_words_out():
+    stopped = pronunciation.AssessmentStopped("timeout", _segment("the quick brown um"))
+    result = pronunciation._stopped_result(REFERENCE, stopped, "audio")
+    assert _errors(result) == [("um", "Insertion")]
+    assert result["Stopped"] == "timeout"
@@ -1,17 +1,28 @@
 # tts.py
 import os
+import hashlib
 import tempfile
+import threading
 import pyttsx3
 
 from typing import Optional
 
 
 class TTS:
+    # pyttsx3 engines must not be driven from two threads at once
+    _LOCK = threading.Lock()
+    # Number of generated files kept in the temp directory
+    MAX_FILES = 32
+
     @classmethod
     def gen_tts_audio(cls, text: Optional[str]) -> str:
         """
         Generate TTS audio offline using pyttsx3.
 
+        Audio is written to a file named after the text, so a text that was
+        already generated (e.g. by the prefetcher) is returned without
+        running the engine again.
+
         Args:
             text: The text to convert to speech.
 
@@ -24,8 +35,18 @@ class TTS:
         # Prepare temporary directory
         tmpdir = os.path.join(tempfile.gettempdir(), "ankipa")
         os.makedirs(tmpdir, exist_ok=True)
-        tmp_path = os.path.join(tmpdir, "tts_output.wav")
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+        tmp_path = os.path.join(tmpdir, f"tts-{digest}.wav")
+
+        with cls._LOCK:
+            if not os.path.exists(tmp_path):
+                cls._generate(text, tmp_path)
+                cls._cleanup(tmpdir)
+
+        return tmp_path
 
+    @classmethod
+    def _generate(cls, text: str, tmp_path: str):
         # Initialize TTS engine
         engine = pyttsx3.init()
 
@@ -50,4 +71,17 @@ class TTS:
         engine.runAndWait()
         engine.stop()
 
-        return tmp_path
+    @classmethod
+    def _cleanup(cls, tmpdir: str):
+        """Remove the oldest generated files beyond MAX_FILES."""
+        files = [
+            os.path.join(tmpdir, name)
+            for name in os.listdir(tmpdir)
+            if name.startswith("tts-") and name.endswith(".wav")
+        ]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[cls.MAX_FILES:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass